@@ -0,0 +1,70 @@
+"""Benchmark for the CSV ingest in CSVDataReader.
+
+Generates synthetic podcasts.csv / episodes.csv files of increasing size and times
+read_catalog(). Ingest time per row should stay
+roughly constant as the row count grows.
+
+Usage (from the project directory):
+    python -m benchmarks.bench_csv_ingest --episodes 1000000 --podcasts 1000
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['REPOSITORY'] = 'Memory'
+
+from podcast.adapters.datareader.csvdatareader import CSVDataReader
+
+
+def write_catalog(directory: Path, podcasts: int, episodes: int):
+    with open(directory / 'podcasts.csv', 'w', newline='') as podcast_file:
+        writer = csv.writer(podcast_file)
+        writer.writerow(['id', 'title', 'image', 'description', 'language', 'categories', 'website', 'author',
+                         'itunes_id'])
+        for podcast_id in range(1, podcasts + 1):
+            writer.writerow([podcast_id, f'Podcast {podcast_id}', 'http://example.com/image.jpg',
+                             f'Description of podcast {podcast_id}', 'English',
+                             f'Category {podcast_id % 50} | Category {podcast_id % 7}',
+                             'http://example.com', f'Author {podcast_id % 1000}', 100000 + podcast_id])
+
+    with open(directory / 'episodes.csv', 'w', newline='') as episode_file:
+        writer = csv.writer(episode_file)
+        writer.writerow(['id', 'podcast_id', 'title', 'audio', 'audio_length', 'description', 'pub_date'])
+        # Episodes are written newest first so every podcast's list has to be sorted.
+        for episode_id in range(episodes, 0, -1):
+            writer.writerow([episode_id, episode_id % podcasts + 1, f'Episode {episode_id}',
+                             'http://example.com/audio.mp3', 1800, f'<p>Episode {episode_id} notes</p>',
+                             '2017-12-01 00:09:47+00'])
+
+
+def time_ingest(directory: Path, workers: int) -> float:
+    start = time.perf_counter()
+    CSVDataReader(directory, workers=workers).read_catalog()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--episodes', type=int, default=1000000, help='episode rows in the largest run')
+    parser.add_argument('--podcasts', type=int, default=1000, help='podcast rows in every run')
+    parser.add_argument('--steps', type=int, default=4, help='number of runs, doubling the episode count')
+    parser.add_argument('--workers', type=int, default=1, help='processes used to parse the episodes CSV')
+    args = parser.parse_args()
+
+    print(f"{'episodes':>10} {'seconds':>10} {'us/row':>10}")
+    for step in reversed(range(args.steps)):
+        episodes = max(args.episodes >> step, 1)
+        with tempfile.TemporaryDirectory() as directory:
+            write_catalog(Path(directory), args.podcasts, episodes)
+            elapsed = time_ingest(Path(directory), args.workers)
+        print(f'{episodes:>10} {elapsed:>10.2f} {elapsed / episodes * 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
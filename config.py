@@ -12,3 +12,15 @@ class Config:
     SECRET_KEY = environ.get('SECRET_KEY')
     TESTING = environ.get('TESTING')
     REPOSITORY = environ.get('REPOSITORY')
+    INGEST_CHUNK_SIZE = environ.get('INGEST_CHUNK_SIZE')
+    INGEST_WORKERS = environ.get('INGEST_WORKERS')
+    CATALOG_SNAPSHOT = environ.get('CATALOG_SNAPSHOT')
+    EPISODE_STORE = environ.get('EPISODE_STORE')
+    PRELOAD = environ.get('PRELOAD') == 'True'
+    DATABASE_POOL = environ.get('DATABASE_POOL')
+    DATABASE_POOL_SIZE = environ.get('DATABASE_POOL_SIZE')
+    RATING_SUMMARY = environ.get('RATING_SUMMARY')
+    QUERY_CACHE_SIZE = environ.get('QUERY_CACHE_SIZE')
+    QUERY_CACHE_TTL = environ.get('QUERY_CACHE_TTL')
+    SEARCH_CACHE_SIZE = environ.get('SEARCH_CACHE_SIZE')
+    SEARCH_CACHE_KB = environ.get('SEARCH_CACHE_KB')
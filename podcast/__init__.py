@@ -1,12 +1,12 @@
 """Initialize Flask app."""
 from pathlib import Path
 from flask import Flask
+import gc
 import os
 
 # imports from SQLAlchemy
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import inspect
 from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool
 
 from podcast.domainmodel.model import Podcast
 from podcast.adapters.memory_repository import MemoryRepository
@@ -14,10 +14,26 @@ from podcast.adapters.memory_repository import MemoryRepository
 # local imports
 import podcast.adapters.repository as repo
 from podcast.adapters.database_repository import SqlAlchemyRepository
+from podcast.adapters.cache import QueryCache, id_list_size
 from podcast.adapters.memory_repository import populate
 from podcast.adapters.populate_repository import populate_db
+from podcast.adapters.datareader.csvdatareader import CSVDataReader
+from podcast.adapters.datareader.snapshot import load_catalog
+from podcast.adapters.episode_store import move_episodes_to_store
+from podcast.adapters.engine import create_database_engine
 from podcast.adapters.orm import mapper_registry, map_model_to_tables
 
+def create_search_cache(size, kilobytes) -> QueryCache | None:
+    """Cache of ordered search result ids, bounded by entries and by memory. A size or memory limit
+    of 0 turns it off."""
+    # Settings left empty in .env arrive as empty strings and use the defaults too
+    size = 500 if size in (None, '') else int(size)
+    kilobytes = 4096 if kilobytes in (None, '') else int(kilobytes)
+    if size <= 0 or kilobytes <= 0:
+        return None
+    return QueryCache(size, max_bytes=kilobytes * 1024, sizeof=id_list_size)
+
+
 """To disable the testing configurations comment out the test test_config variable below
  and the program will automatically switch to the main default configurations"""
 # test_config = {'TEST_DATA_PATH': Path('tests/test_data')}
@@ -36,16 +52,27 @@ def create_app(test_config=None):
         app.config['SQLALCHEMY_ECHO'] = True  # echo SQL statements - useful for debugging
         app.config['TEMPLATES_AUTO_RELOAD'] = True  # HTML changes on page refresh
         app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+        # This branch does not load config.Config, so its settings are read here
+        app.config['PRELOAD'] = os.environ.get('PRELOAD') == 'True'
 
-        # Create a database engine and connect it to the specified database
-        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=NullPool,
-                                        echo=False)
+        # Create a database engine and connect it to the specified database. Connections are pooled,
+        # so requests reuse them instead of opening a new one for every query.
+        database_engine = create_database_engine(database_uri, os.environ.get('DATABASE_POOL') or 'queue',
+                                                 int(os.environ.get('DATABASE_POOL_SIZE') or 5))
 
         # Create the database session factory using sessionmaker (this has to be done once, in a global manner)
         session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
 
         # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
-        repo.repo_instance = SqlAlchemyRepository(session_factory)
+        # RATING_SUMMARY keeps per-podcast rating totals in their own table, updated with each review
+        rating_summary = os.environ.get('RATING_SUMMARY') == 'True'
+        # QUERY_CACHE_SIZE catalog query results are kept for QUERY_CACHE_TTL seconds; a size of 0 turns it off
+        cache_size = int(os.environ.get('QUERY_CACHE_SIZE') or 1000)
+        cache_ttl = os.environ.get('QUERY_CACHE_TTL')
+        query_cache = QueryCache(cache_size, float(cache_ttl) if cache_ttl else None) if cache_size > 0 else None
+        search_cache = create_search_cache(os.environ.get('SEARCH_CACHE_SIZE'), os.environ.get('SEARCH_CACHE_KB'))
+        repo.repo_instance = SqlAlchemyRepository(session_factory, rating_summary=rating_summary, cache=query_cache,
+                                                  search_cache=search_cache)
         data_path = os.path.abspath('podcast')
 
         if len(inspect(database_engine).get_table_names()) == 0:
@@ -62,12 +89,42 @@ def create_app(test_config=None):
             # Generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
 
-            populate_db(data_path, repo.repo_instance)
-            print("REPOPULATING DATABASE... FINISHED")
+            # INGEST_CHUNK_SIZE streams the CSV files into the database in chunks of that many rows
+            chunk_size = os.environ.get('INGEST_CHUNK_SIZE')
+            report = populate_db(data_path, repo.repo_instance, chunk_size=int(chunk_size) if chunk_size else None,
+                                 progress=lambda table, rows, rate: print(f"  {table}: {rows} rows ({rate:.0f} rows/sec)"))
+            print(f"REPOPULATING DATABASE... FINISHED: {report.total_rows} rows in {report.seconds:.2f}s "
+                  f"({report.rows_per_second:.0f} rows/sec)")
 
         else:
+            # Add indexes and tables that databases created by older versions are missing. Imported
+            # here so the module can also be run on its own with python -m.
+            from podcast.adapters.migrations import upgrade
+            upgrade(database_engine)
             # Solely generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
+            # Databases created before the full-text search table get it on first start
+            repo.repo_instance.ensure_search_index()
+            # The summary may be behind if reviews were added while it was switched off
+            if rating_summary:
+                repo.repo_instance.rebuild_rating_summary()
+
+        # Search suggestions are served from memory, without querying
+        repo.repo_instance.build_suggestion_index()
+        repo.repo_instance.close_session()
+        # A preloaded app is forked into workers, and SQLite connections must not cross a fork.
+        # Closing the pooled ones makes every worker open its own.
+        if app.config['PRELOAD']:
+            database_engine.dispose()
+
+        # Every request gets its own session, which is closed when the request ends
+        @app.before_request
+        def open_database_session():
+            repo.repo_instance.reset_session()
+
+        @app.teardown_request
+        def close_database_session(exception=None):
+            repo.repo_instance.close_session()
 
     else:
         if test_config is not None:
@@ -78,8 +135,20 @@ def create_app(test_config=None):
             app.config.from_object('config.Config')
             data_path = Path('podcast') / 'adapters' / 'data'
 
-        repo.repo_instance = MemoryRepository()
-        populate(repo.repo_instance, data_path)
+        # CATALOG_SNAPSHOT loads the catalog from a binary snapshot instead of parsing the CSV files
+        if app.config.get('CATALOG_SNAPSHOT'):
+            catalog = load_catalog(data_path, app.config['CATALOG_SNAPSHOT'])
+        else:
+            catalog = CSVDataReader(data_path).read_catalog()
+
+        # EPISODE_STORE keeps the episodes in a memory-mapped file whose pages all workers share
+        if app.config.get('EPISODE_STORE'):
+            move_episodes_to_store(catalog, app.config['EPISODE_STORE'],
+                                   CSVDataReader(data_path).source_pathways())
+
+        repo.repo_instance = MemoryRepository(create_search_cache(app.config.get('SEARCH_CACHE_SIZE'),
+                                                                  app.config.get('SEARCH_CACHE_KB')))
+        populate(repo.repo_instance, data_path, catalog)
 
 
 
@@ -103,4 +172,17 @@ def create_app(test_config=None):
         from .authentication import authentication
         app.register_blueprint(authentication.authentication_blueprint)
 
-        return app
+        from .diagnostics import diagnostics
+        app.register_blueprint(diagnostics.diagnostics_blueprint)
+
+    # PRELOAD is for servers that build the app once and then fork workers (gunicorn --preload).
+    # The catalog is frozen so the workers keep sharing its memory pages.
+    if app.config.get('PRELOAD'):
+        if isinstance(repo.repo_instance, MemoryRepository):
+            repo.repo_instance.freeze()
+        # Objects alive now are moved out of the collector's reach, so collections in the
+        # workers never write to their pages.
+        gc.collect()
+        gc.freeze()
+
+    return app
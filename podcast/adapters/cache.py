@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from podcast.adapters.search import FUZZY, SEARCH_FIELDS, normalize_query
+
+# Tag of the entries that read the podcast catalog, which every catalog write invalidates
+CATALOG = 'catalog'
+
+# Bytes taken by an int object that is not one of the small ints Python shares
+INT_SIZE = sys.getsizeof(10 ** 6)
+
+
+def search_cache_key(query: str, filter_by: str) -> tuple:
+    # Queries that only differ in case, spacing or punctuation share their results
+    return normalize_query(query), filter_by if filter_by in SEARCH_FIELDS or filter_by == FUZZY else 'all'
+
+
+def id_list_size(podcast_ids) -> int:
+    """Rough number of bytes a cached tuple of podcast ids holds on to."""
+    return sys.getsizeof(podcast_ids) + INT_SIZE * len(podcast_ids)
+
+
+class QueryCache:
+    """Size-bounded LRU cache of query results, with an optional time to live.
+
+    Every entry carries a tag, so a write can drop just the entries it affects. Entries only go
+    stale through writes made elsewhere (another process, or the database edited directly), and
+    the time to live bounds how long that lasts. With max_bytes, entries are also evicted once
+    their sizes, as measured by sizeof, add up to more than that."""
+
+    def __init__(self, max_entries: int = 1000, ttl: float | None = None, clock=time.monotonic,
+                 max_bytes: int | None = None, sizeof=None):
+        if max_entries < 1:
+            raise ValueError('A query cache needs room for at least one entry.')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.__clock = clock
+        self.__sizeof = sizeof
+        # key -> (tag, expiry time or None, value, size), least recently used first
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        with self.__lock:
+            return self.__lookup(key) is not None
+
+    def __lookup(self, key):
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        expires = entry[1]
+        if expires is not None and self.__clock() >= expires:
+            self.__remove(key)
+            return None
+        self.__entries.move_to_end(key)
+        return entry
+
+    def get_or_load(self, key, load, tag=CATALOG):
+        """Returns the cached result for key, or calls load() and caches what it returns."""
+        with self.__lock:
+            entry = self.__lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Loaded without holding the lock, so a slow query does not hold up hits, and a loader
+        # may itself read through the cache
+        value = load()
+        expires = self.__clock() + self.ttl if self.ttl is not None else None
+        size = self.__sizeof(value) if self.__sizeof is not None else 0
+        with self.__lock:
+            self.__remove(key)
+            self.__entries[key] = (tag, expires, value, size)
+            self.__bytes += size
+            # A result bigger than max_bytes on its own is returned but not kept
+            while self.__entries and (len(self.__entries) > self.max_entries or
+                                      self.max_bytes is not None and self.__bytes > self.max_bytes):
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+        return value
+
+    def __remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[3]
+
+    def invalidate(self, tag):
+        """Drops the entries with the given tag."""
+        with self.__lock:
+            for key in [key for key, entry in self.__entries.items() if entry[0] == tag]:
+                self.__remove(key)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {'entries': len(self.__entries), 'max_entries': self.max_entries, 'ttl': self.ttl,
+                    'bytes': self.__bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
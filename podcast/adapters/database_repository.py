@@ -1,22 +1,73 @@
 from __future__ import annotations
 
+import functools
 import json
 from abc import ABC
 from typing import List, Type, Optional, Any
 
-from sqlalchemy import func
-from sqlalchemy.orm import scoped_session, Session
+from sqlalchemy import case, func, inspect, select, tuple_
+from sqlalchemy.orm import scoped_session, Session, joinedload, selectinload
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy import func
 import _json
 
 from podcast.domainmodel.model import Podcast, Author
-from podcast.adapters.repository import AbstractRepository
+from podcast.adapters.repository import (AbstractRepository, RepositoryException, Page, RatingSummary,
+                                         rating_bucket)
+from podcast.adapters.cache import CATALOG, QueryCache, search_cache_key
+from podcast.adapters.search import FUZZY, SUGGESTIONS, FuzzyIndex, SearchIndex, SuggestionIndex
+from podcast.adapters.fulltext import (count_matches, rebuild_search_table, refresh_search_rows, search_podcast_ids,
+                                       search_table_exists)
 # from podcast.adapters.utils import search_string
 from podcast.domainmodel.model import Podcast, Author, Category, User, Review, Episode
 # from podcast.browse.services import get_podcasts
 import podcast.adapters.repository as repo
-from podcast.adapters.orm import authors_table, podcast_categories_table, user_table
+from podcast.adapters.orm import (authors_table, categories_table, podcast_categories_table, podcast_table,
+                                  rating_summary_table, reviews_table, user_subscriptions_table, user_table)
+
+
+def podcast_loader_options(view: str = 'card') -> tuple:
+    """Loader options for what a view reads from its podcasts, so that rendering them does not
+    query once per podcast. A 'card' on a list page shows the author and categories; the
+    'detail' page also lists the episodes."""
+    options = (joinedload(Podcast._author), selectinload(Podcast.categories))
+    if view == 'detail':
+        options += (selectinload(Podcast.episodes),)
+    elif view != 'card':
+        raise RepositoryException(f'No loader options for {view} views')
+    return options
+
+
+def cache_key(name: str, args: tuple, kwargs: dict) -> tuple:
+    # Cursors decoded from JSON arrive as lists, which cannot be hashed
+    def freeze(value):
+        return tuple(value) if isinstance(value, list) else value
+    return name, tuple(freeze(arg) for arg in args), tuple(sorted((key, freeze(value)) for key, value in kwargs.items()))
+
+
+def cached_query(tag=lambda *args, **kwargs: CATALOG):
+    """Serves a read method from the repository's query cache, when it has one. tag is called
+    with the method's arguments and names the group of entries a write invalidates."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._cache is None:
+                return method(self, *args, **kwargs)
+            return self._cached(cache_key(method.__name__, args, kwargs),
+                                lambda: method(self, *args, **kwargs), tag(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def reviews_tag(podcast_id, *args, **kwargs):
+    return 'reviews', podcast_id
+
+
+def rating_bucket_expression():
+    # SQL version of rating_bucket: the whole-star bucket, 1 to 5, of reviews.rating
+    rating = reviews_table.c.rating
+    return case((rating < 2, 1), (rating < 3, 2), (rating < 4, 3), (rating < 5, 4), else_=5)
 
 
 # feature 1 test
@@ -42,20 +93,37 @@ class SessionContextManager:
         self.__session.rollback()
 
     def reset_session(self):
-        # this method can be used e.g. to allow Flask to start a new session for each http request,
-        # via the 'before_request' callback
+        # Flask calls this from 'before_request', so each http request starts with a fresh session.
+        # The scoped_session registry is kept; it hands every thread its own session.
         self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
 
     def close_current_session(self):
+        # Closes this thread's session and gives its connection back to the pool
         if not self.__session is None:
-            self.__session.close()
+            self.__session.remove()
 
 
 class SqlAlchemyRepository(AbstractRepository, ABC):
 
-    def __init__(self, session_factory):
+    def __init__(self, session_factory, rating_summary: bool = False, cache: QueryCache = None,
+                 search_cache: QueryCache = None):
         self._session_cm = SessionContextManager(session_factory)
+        # With a cache, catalog reads are served from it until a write invalidates them
+        self._cache = cache
+        # With a search cache, each search runs once and its pages are slices of the cached ids
+        self._search_cache = search_cache
+        # With rating_summary, add_review keeps podcast_rating_summary up to date and ratings are
+        # read from it instead of being aggregated from the reviews
+        self._rating_summary = rating_summary
+        # Whether the database has the FTS5 search table, checked on first use
+        self._fts_ready = None
+        # Fallback for databases without the search table; built from the podcasts table on
+        # the first search and dropped when podcasts are added
+        self._search_index = None
+        # Names suggested as a search is typed, held in memory so suggestions do not query
+        self._suggestions = None
+        # Trigram index for typo tolerant searches, built from titles and authors on first use
+        self._fuzzy_index = None
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -63,6 +131,55 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     def reset_session(self):
         self._session_cm.reset_session()
 
+    @property
+    def query_cache(self) -> QueryCache | None:
+        return self._cache
+
+    @property
+    def search_cache(self) -> QueryCache | None:
+        return self._search_cache
+
+    def _cached(self, key: tuple, load, tag):
+        def load_detached():
+            value = load()
+            self._detach(value.items if isinstance(value, Page) else value)
+            return value
+
+        value = self._cache.get_or_load(key, load_detached, tag)
+        # Callers get their own list, so they cannot change the cached one
+        return list(value) if isinstance(value, list) else value
+
+    def _detach(self, value):
+        # Cached objects outlive the session that loaded them and are shared between requests.
+        # They are detached, along with everything loaded alongside them, so a commit in that
+        # session cannot expire them.
+        session = self._session_cm.session
+        pending = list(value) if isinstance(value, list) else [value]
+        seen = set()
+        while pending:
+            instance = pending.pop()
+            state = inspect(instance, raiseerr=False)
+            if state is None or id(instance) in seen:
+                continue
+            seen.add(id(instance))
+            for relationship in state.mapper.relationships:
+                if relationship.key in state.unloaded:
+                    continue
+                related = state.dict.get(relationship.key)
+                if related is not None:
+                    pending.extend(related if relationship.uselist else [related])
+            if instance in session:
+                session.expunge(instance)
+
+    def _catalog_changed(self):
+        self._search_index = None
+        self._suggestions = None
+        self._fuzzy_index = None
+        if self._cache is not None:
+            self._cache.invalidate(CATALOG)
+        if self._search_cache is not None:
+            self._search_cache.clear()
+
     # region Podcast_data
     def get_podcasts(self, sorting: bool = False) -> list[Type[Podcast]]:
         podcasts = self._session_cm.session.query(Podcast).all()
@@ -79,6 +196,33 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
 
         return podcast
 
+    def get_podcast_by_id(self, podcast_id: int) -> Podcast | None:
+        return self._session_cm.session.get(Podcast, podcast_id)
+
+    def get_podcast_by_title(self, podcast_title: str) -> Podcast | None:
+        return self._session_cm.session.query(Podcast).filter(Podcast._title == podcast_title).first()
+
+    @cached_query()
+    def get_podcast_details(self, podcast_title: str) -> Podcast | None:
+        # One query for the podcast and its author, plus one each for categories and episodes
+        query = (
+            self._session_cm.session.query(Podcast)
+            .options(*podcast_loader_options('detail'))
+            .filter(Podcast._title == podcast_title)
+        )
+        return query.first()
+
+    @cached_query()
+    def get_podcasts_by_category(self, category_id: int) -> list[Podcast]:
+        query = (
+            self._session_cm.session.query(Podcast)
+            .join(podcast_categories_table, podcast_categories_table.c.podcast_id == Podcast._id)
+            .filter(podcast_categories_table.c.category_id == category_id)
+            .options(*podcast_loader_options('card'))
+            .order_by(Podcast._title)
+        )
+        return query.all()
+
     def get_podcast_id_by_title(self, podcast_title):
         podcast = self._session_cm.session.query(Podcast).filter_by(_title=podcast_title).first()
 
@@ -91,12 +235,83 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     def add_review(self, review: Review):
         with self._session_cm as scm:
             # print(f'Adding user: {user}, Type: {type(user)}')
+            podcast = review.reviewed_podcast
+            if podcast is not None and inspect(podcast).detached:
+                # A cached podcast is shared between requests, so the review refers to this
+                # session's copy rather than pulling the shared one into the session
+                review._reviewed_podcast = scm.session.merge(podcast, load=False)
             scm.session.add(review)
+            if self._rating_summary and podcast is not None:
+                self._add_to_rating_summary(scm.session.connection(), podcast.id, review.user_rating)
             scm.commit()
-
-    def get_reviews_by_podcast_id(self, podcast_id: int) -> list:
-        reviews = self._session_cm.session.query(Review).join(Review._reviewed_podcast).filter(
-            Podcast._id == podcast_id).all()
+        if self._cache is not None and podcast is not None:
+            self._cache.invalidate(reviews_tag(podcast.id))
+
+    def _add_to_rating_summary(self, connection, podcast_id: int, rating: float):
+        bucket = rating_summary_table.c[f'rating_{rating_bucket(rating)}']
+        updated = connection.execute(
+            rating_summary_table.update()
+            .where(rating_summary_table.c.podcast_id == podcast_id)
+            .values({rating_summary_table.c.review_count: rating_summary_table.c.review_count + 1,
+                     rating_summary_table.c.rating_sum: rating_summary_table.c.rating_sum + rating,
+                     bucket: bucket + 1}))
+        if updated.rowcount == 0:
+            row = {'podcast_id': podcast_id, 'review_count': 1, 'rating_sum': rating}
+            row.update({f'rating_{stars}': int(stars == rating_bucket(rating)) for stars in range(1, 6)})
+            connection.execute(rating_summary_table.insert(), row)
+
+    def rebuild_rating_summary(self):
+        """Recomputes podcast_rating_summary from the reviews, e.g. when the summary is first enabled."""
+        bucket = rating_bucket_expression()
+        query = (
+            select(reviews_table.c.podcast_id, func.count(), func.sum(reviews_table.c.rating),
+                   *[func.sum(case((bucket == stars, 1), else_=0)) for stars in range(1, 6)])
+            .group_by(reviews_table.c.podcast_id)
+        )
+        columns = ['podcast_id', 'review_count', 'rating_sum'] + [f'rating_{stars}' for stars in range(1, 6)]
+        with self._session_cm as scm:
+            connection = scm.session.connection()
+            connection.execute(rating_summary_table.delete())
+            connection.execute(rating_summary_table.insert().from_select(columns, query))
+            scm.commit()
+        if self._cache is not None:
+            self._cache.clear()
+
+    @cached_query(tag=reviews_tag)
+    def get_rating_summary(self, podcast_id: int) -> RatingSummary:
+        connection = self._session_cm.session.connection()
+        if self._rating_summary:
+            row = connection.execute(
+                select(rating_summary_table).where(rating_summary_table.c.podcast_id == podcast_id)).mappings().first()
+            if row is None:
+                return RatingSummary()
+            return RatingSummary(row['review_count'], row['rating_sum'],
+                                 {stars: row[f'rating_{stars}'] for stars in range(1, 6)})
+
+        # One aggregate over the podcast's reviews, grouped into at most five buckets
+        bucket = rating_bucket_expression()
+        query = (
+            select(bucket, func.count(), func.sum(reviews_table.c.rating))
+            .where(reviews_table.c.podcast_id == podcast_id)
+            .group_by(bucket)
+        )
+        summary = RatingSummary()
+        for stars, count, total in connection.execute(query):
+            summary.count += count
+            summary.total += total
+            summary.histogram[stars] = count
+        return summary
+
+    @cached_query(tag=reviews_tag)
+    def get_reviews_by_podcast_id(self, podcast_id: int, limit: int = None) -> list:
+        # With a limit, the newest reviews are returned, still oldest first
+        query = (self._session_cm.session.query(Review)
+                 .filter(reviews_table.c.podcast_id == podcast_id)
+                 .order_by(reviews_table.c.review_id.desc()))
+        if limit is not None:
+            query = query.limit(limit)
+        reviews = query.all()
+        reviews.reverse()
 
         # Return the list of reviews
         return reviews
@@ -112,7 +327,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
 
     def get_comment_section(self, podcast_title: str) -> list:
         try:
-            query = self._session_cm.session.query(Podcast).filter(Podcast.title == podcast_title)
+            query = self._session_cm.session.query(Podcast).filter(Podcast._title == podcast_title)
             podcast = query.one()
             return podcast.deserialize_comments()
 
@@ -122,9 +337,9 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
 
     def get_review_section(self, podcast_title: str) -> list:
         try:
-            query = self._session_cm.session.query(Podcast).filter(Podcast.title == podcast_title)
+            query = self._session_cm.session.query(Podcast).filter(Podcast._title == podcast_title)
             podcast = query.one()
-            return podcast.deserialize_reviews()
+            return podcast.deserialize_user_reviews()
 
         except NoResultFound:
             print(f'Podcast "{podcast_title}" was not found.')
@@ -133,7 +348,11 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     def add_podcast(self, podcast: Podcast):
         with self._session_cm as scm:
             scm.session.merge(podcast)
+            if self._search_table_ready():
+                scm.session.flush()
+                refresh_search_rows(scm.session.connection(), [podcast.id])
             scm.commit()
+        self._catalog_changed()
 
     def add_multiple_podcasts(self, podcasts: List[Podcast]):
         with self._session_cm as scm:
@@ -141,15 +360,45 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
                 podcast.set_comments = podcast.serialize_comments()
                 podcast.user_reviews = podcast.serialize_user_reviews()
                 scm.session.add(podcast)
+            if self._search_table_ready():
+                scm.session.flush()
+                refresh_search_rows(scm.session.connection(), [podcast.id for podcast in podcasts])
             scm.commit()
+        self._catalog_changed()
 
+    @cached_query()
     def get_number_of_podcasts(self) -> int:
         num_podcasts = self._session_cm.session.query(Podcast).count()
         return num_podcasts
 
+    @cached_query()
+    def get_podcasts_page(self, offset: int, limit: int, sort: str = 'title', after: tuple = None,
+                          before: tuple = None, last: bool = False) -> Page:
+        if sort == 'title':
+            order = (Podcast._title, Podcast._id)
+        elif sort == 'id':
+            order = (Podcast._id,)
+        else:
+            raise RepositoryException(f'Podcasts cannot be sorted by {sort}')
+
+        # Cursors seek on the sort columns instead of counting past OFFSET rows. Pages before a
+        # cursor, and the last page, are read in reverse order and flipped back.
+        query = self._session_cm.session.query(Podcast).options(*podcast_loader_options('card'))
+        if after is not None:
+            podcasts = query.filter(tuple_(*order) > tuple_(*after)).order_by(*order).limit(limit).all()
+        elif before is not None or last:
+            if before is not None:
+                query = query.filter(tuple_(*order) < tuple_(*before))
+            podcasts = query.order_by(*(column.desc() for column in order)).limit(limit).all()
+            podcasts.reverse()
+        else:
+            podcasts = query.order_by(*order).offset(offset).limit(limit).all()
+        return Page(podcasts, self.get_number_of_podcasts())
+
     # endregion
 
     # region Author data
+    @cached_query()
     def get_authors(self) -> list[Type[Author]]:
         authors = self._session_cm.session.query(Author).all()
         return authors
@@ -169,6 +418,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
         with self._session_cm as scm:
             scm.session.merge(author)
             scm.commit()
+        self._catalog_changed()
 
     def add_multiple_authors(self, authors: List[Author]):
         with self._session_cm as scm:
@@ -178,6 +428,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
                         raise ValueError("Author name cannot be None")
                     scm.session.add(author)
             scm.commit()
+        self._catalog_changed()
 
     def get_number_of_authors(self) -> int:
         num_authors = self._session_cm.session.query(Author).count()
@@ -189,6 +440,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     # endregion
 
     # region Category_data
+    @cached_query()
     def get_categories(self) -> list[Type[Category]]:
         categories = self._session_cm.session.query(Category).all()
         return categories
@@ -208,6 +460,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
         with self._session_cm as scm:
             scm.session.merge(category)
             scm.commit()
+        self._catalog_changed()
 
     def add_multiple_categories(self, categories: List[Category]):
         with self._session_cm as scm:
@@ -215,6 +468,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
                 for category in categories:
                     scm.session.add(category)
             scm.commit()
+        self._catalog_changed()
 
     # endregion
 
@@ -229,12 +483,34 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
         with self._session_cm as scm:
             scm.session.merge(episode)
             scm.commit()
+        self._catalog_changed()
 
     def add_multiple_episodes(self, episode: List[Episode]):
         with self._session_cm as scm:
             for episode in episode:
                 scm.session.merge(episode)
             scm.commit()
+        self._catalog_changed()
+
+    def bulk_load(self, batches, progress=None) -> dict:
+        """Inserts (table, rows) batches with one executemany each, all in a single transaction.
+
+        Rows are plain dictionaries of column values, so no ORM objects or per-row SELECTs are
+        involved. progress is called with the table name and the rows loaded into it so far
+        after every batch. Returns the number of rows loaded per table."""
+        loaded = dict()
+        with self._session_cm as scm:
+            connection = scm.session.connection()
+            for table, rows in batches:
+                if not rows:
+                    continue
+                connection.execute(table.insert(), rows)
+                loaded[table.name] = loaded.get(table.name, 0) + len(rows)
+                if progress is not None:
+                    progress(table.name, loaded[table.name])
+            scm.commit()
+        self._catalog_changed()
+        return loaded
 
     def get_number_of_episodes(self) -> List[Episode]:
         pass
@@ -252,35 +528,157 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     def get_number_of_episodes_for_podcast(self, podcast_id: int) -> int:
         return len(self.get_episodes_for_podcast(podcast_id))
 
+    def _search_table_ready(self) -> bool:
+        if self._fts_ready is None:
+            self._fts_ready = search_table_exists(self._session_cm.session.connection())
+        return self._fts_ready
+
+    def rebuild_search_index(self) -> bool:
+        """Refills the FTS5 search table from the podcast tables, creating it if needed.
+        Returns False when the database cannot hold one, in which case searches fall back."""
+        with self._session_cm as scm:
+            self._fts_ready = rebuild_search_table(scm.session.connection())
+            scm.commit()
+        self._catalog_changed()
+        return self._fts_ready
+
+    def ensure_search_index(self):
+        if not self._search_table_ready():
+            self.rebuild_search_index()
+
+    @cached_query()
+    def _podcasts_in_order(self, podcast_ids: list[int]) -> list[Podcast]:
+        if not podcast_ids:
+            return []
+        podcasts = (
+            self._session_cm.session.query(Podcast)
+            .options(*podcast_loader_options('card'))
+            .filter(Podcast._id.in_(podcast_ids))
+            .all()
+        )
+        podcasts_by_id = {podcast.id: podcast for podcast in podcasts}
+        return [podcasts_by_id[podcast_id] for podcast_id in podcast_ids if podcast_id in podcasts_by_id]
+
+    def search_podcast_ids(self, query: str, filter_by: str = 'all') -> tuple:
+        """The ids of every podcast matching the query, best match first."""
+        def search():
+            if filter_by == FUZZY:
+                return tuple(self._fuzzy_search_index().search(query))
+            if self._search_table_ready():
+                return tuple(search_podcast_ids(self._session_cm.session.connection(), query, filter_by))
+            return tuple(self._fallback_search_index().search(query, filter_by))
+
+        if self._search_cache is None:
+            return search()
+        return self._search_cache.get_or_load(search_cache_key(query, filter_by), search)
+
+    def search_podcasts(self, query: str, filter_by: str = 'all') -> list[Podcast]:
+        return self._podcasts_in_order(self.search_podcast_ids(query, filter_by))
+
+    def search_podcasts_page(self, query: str, filter_by: str, offset: int, limit: int) -> Page:
+        if self._search_cache is not None or filter_by == FUZZY:
+            podcast_ids = self.search_podcast_ids(query, filter_by)
+            return Page(self._podcasts_in_order(podcast_ids[offset:offset + limit]), len(podcast_ids))
+
+        # Without the cache only one page of ids is read, and the matches are counted
+        if self._search_table_ready():
+            connection = self._session_cm.session.connection()
+            podcast_ids = search_podcast_ids(connection, query, filter_by, offset=offset, limit=limit)
+            return Page(self._podcasts_in_order(podcast_ids), count_matches(connection, query, filter_by))
+
+        podcast_ids = self._fallback_search_index().search(query, filter_by)
+        return Page(self._podcasts_in_order(podcast_ids[offset:offset + limit]), len(podcast_ids))
+
+    def _fuzzy_search_index(self) -> FuzzyIndex:
+        if self._fuzzy_index is None:
+            rows = self._session_cm.session.connection().execute(
+                select(podcast_table.c.podcast_id, podcast_table.c.podcast_title, authors_table.c.author_name)
+                .outerjoin(authors_table, authors_table.c.author_id == podcast_table.c.author_id))
+            fuzzy_index = FuzzyIndex()
+            for podcast_id, title, author_name in rows:
+                fuzzy_index.add(podcast_id, {'title': title, 'author': author_name})
+            self._fuzzy_index = fuzzy_index
+        return self._fuzzy_index
+
+    def build_suggestion_index(self):
+        """Reads every title, and every author and category with its number of podcasts, into the
+        in-memory suggestion index."""
+        connection = self._session_cm.session.connection()
+        titles = connection.execute(select(podcast_table.c.podcast_title)).scalars()
+        authors = connection.execute(
+            select(authors_table.c.author_name, func.count(podcast_table.c.podcast_id))
+            .join(podcast_table, podcast_table.c.author_id == authors_table.c.author_id)
+            .group_by(authors_table.c.author_id))
+        categories = connection.execute(
+            select(categories_table.c.category_name, func.count(podcast_categories_table.c.podcast_id))
+            .join(podcast_categories_table, podcast_categories_table.c.category_id == categories_table.c.category_id)
+            .group_by(categories_table.c.category_id))
+        entries = [('title', title, 1) for title in titles if title]
+        entries += [('author', name, count) for name, count in authors if name]
+        entries += [('category', name, count) for name, count in categories if name]
+        self._suggestions = SuggestionIndex(entries)
+
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS) -> list[tuple[str, str]]:
+        if self._suggestions is None:
+            self.build_suggestion_index()
+        return self._suggestions.suggest(prefix, limit)
+
+    def _fallback_search_index(self) -> SearchIndex:
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            # Indexing reads every podcast's author and categories
+            podcasts = self._session_cm.session.query(Podcast).options(*podcast_loader_options('card')).all()
+            for podcast in podcasts:
+                self._search_index.add_podcast(podcast)
+        return self._search_index
+
+    # The three searches below use the FTS5 table when there is one, with prefix matching on
+    # the last term and phrase matching for quoted queries, and fall back to LIKE scans
+    @cached_query()
     def search_podcast_by_title(self, title_string: str) -> list[Type[Podcast]]:
         all_podcasts = []
 
-        query = self._session_cm.session.query(Podcast).filter(
-            Podcast._title.ilike(f'%{title_string}%'))
+        if self._search_table_ready():
+            all_podcasts = self.search_podcasts(title_string, 'title')
+        else:
+            query = self._session_cm.session.query(Podcast).options(*podcast_loader_options('card')).filter(
+                Podcast._title.ilike(f'%{title_string}%'))
+            all_podcasts = query.all()
 
-        all_podcasts = query.all()
         if not all_podcasts:
             print(f'No titles contained {title_string}')
         return all_podcasts
 
+    @cached_query()
     def search_podcast_by_author(self, author_name: str) -> List[Podcast]:
         all_podcasts = []
 
-        query = (
-            self._session_cm.session.query(Podcast)
-            .join(authors_table, Podcast.author_id == authors_table.c.author_id)
-            .filter(authors_table.c.author_name.ilike(f'%{author_name}%'))
-        )
-        all_podcasts = query.all()
+        if self._search_table_ready():
+            all_podcasts = self.search_podcasts(author_name, 'author')
+        else:
+            query = (
+                self._session_cm.session.query(Podcast)
+                .join(authors_table, Podcast.author_id == authors_table.c.author_id)
+                .filter(authors_table.c.author_name.ilike(f'%{author_name}%'))
+                .options(*podcast_loader_options('card'))
+            )
+            all_podcasts = query.all()
+
         if not all_podcasts:
             print(f'No titles by {author_name}')
         return all_podcasts
 
-    # Needs fixing
+    @cached_query()
     def search_podcast_by_category(self, category_name: str) -> list[Type[Podcast]]:
         """Retrieve podcasts that belong to a specific category by category name."""
         all_podcasts = []
 
+        if self._search_table_ready():
+            all_podcasts = self.search_podcasts(category_name, 'category')
+            if not all_podcasts:
+                print(f'No podcasts found for category: {category_name}')
+            return all_podcasts
+
         category_query = self._session_cm.session.query(Category).filter(
             Category._name.ilike(f'%{category_name}%')).first()
 
@@ -294,6 +692,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
             self._session_cm.session.query(Podcast)
             .join(podcast_categories_table, podcast_categories_table.c.podcast_id == Podcast._id)
             .filter(podcast_categories_table.c.category_id == category_id)
+            .options(*podcast_loader_options('card'))
         )
 
         all_podcasts = podcast_query.all()
@@ -317,20 +716,15 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     def add_user(self, user: User):
         with self._session_cm as scm:
             print(f'Adding user: {user}, Type: {type(user)}')
-            user.subscription_list = user.serialize_subscription_list()
             scm.session.merge(user)
             scm.commit()
 
     #Implementation for adding and removing podcasts from favorites.
     def get_podcast_by_title_from_db(self, podcast_title: str) -> Type[Podcast] | None:
-        podcasts = self._session_cm.session.query(Podcast).all()
-        for podcast in podcasts:
-            if podcast is not None:
-                if podcast.title is not None and podcast.title == podcast_title:
-                    return podcast
-
-        print(f'No podcast found with the title "{podcast_title}"')
-        return None
+        podcast = self.get_podcast_by_title(podcast_title)
+        if podcast is None:
+            print(f'No podcast found with the title "{podcast_title}"')
+        return podcast
 
     def get_episode_from_db(self, episode_id) -> Type[Episode] | None:
         try:
@@ -363,27 +757,34 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
             favorite_podcast.add_episode(episode)
             self._session_cm.session.commit()
 
-    def add_podcast_to_user_subscription(self, user_id: int, podcast: Podcast):
-        if not isinstance(podcast, Podcast):
-            raise TypeError("Expected a Podcast instance.")
-
-        # Fetch the user by ID
-        user = self._session_cm.session.query(User).filter_by(_id=user_id).first()
-        if user is None:
-            raise ValueError(f"User with id {user_id} not found.")
-
-        # Deserialize the user's subscription list
-        user_deserialized_subscriptions = user.deserialize_subscription_list
-
-        # Check if the podcast is not already in the user's subscription list
-        if podcast not in user_deserialized_subscriptions:
-            user_deserialized_subscriptions.append(podcast)
-
-            # Serialize the updated subscription list back to a string
-            user.subscription_list = user.serialize_subscription_list
+    def add_subscription(self, user: User, podcast: Podcast) -> bool:
+        with self._session_cm as scm:
+            try:
+                scm.session.execute(user_subscriptions_table.insert(),
+                                    {'user_id': user.id, 'podcast_id': podcast.id})
+                scm.commit()
+            except IntegrityError:
+                # The primary key already holds this subscription
+                return False
+        return True
+
+    def remove_subscription(self, user: User, podcast: Podcast) -> bool:
+        with self._session_cm as scm:
+            deleted = scm.session.execute(
+                user_subscriptions_table.delete()
+                .where(user_subscriptions_table.c.user_id == user.id)
+                .where(user_subscriptions_table.c.podcast_id == podcast.id))
+            scm.commit()
+        return deleted.rowcount > 0
 
-            # Update the user in the database
-            self._session_cm.session.commit()  # Commit the changes to the database
-        else:
-            print(f'Podcast "{podcast.title}" is already in the subscription list.')
+    def get_subscriptions(self, user: User) -> list[Podcast]:
+        # One join on the user's primary key range, plus the card options
+        query = (
+            self._session_cm.session.query(Podcast)
+            .join(user_subscriptions_table, user_subscriptions_table.c.podcast_id == Podcast._id)
+            .filter(user_subscriptions_table.c.user_id == user.id)
+            .options(*podcast_loader_options('card'))
+            .order_by(user_subscriptions_table.c.subscribed_at, Podcast._id)
+        )
+        return query.all()
 
@@ -1,30 +1,180 @@
+from __future__ import annotations
+
 import csv
+import io
+import locale
 import os
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 
 from podcast.domainmodel.model import Podcast, Episode, Author, Category
 
 
-#Function will return the key for the value
-def get_key_for_value(dict):
-    temp_id = 0
-    for key, auth_obj in dict.items():
-        if auth_obj.id == temp_id:
-            return temp_id
-        temp_id += 1
+# Files smaller than this are parsed in the calling process even when workers are configured,
+# since starting a pool and sending results back costs more than parsing them there
+PARALLEL_INGEST_BYTES = 16 * 1024 * 1024
+
+
+def episode_fields(row: list) -> tuple | None:
+    """Coerces one episodes CSV row into the arguments of Episode(), or returns None if the
+    row is malformed."""
+    try:
+        #Unpacking each row of information
+        episode_id = int(row[0])
+        podcast_id = int(row[1])
+        title = str(row[2])
+        link_to_audio = str(row[3])
+        audio_length = str(row[4])
+        description = str(row[5])
+        publication_data = str(row[6])
+
+    #Will pass the row if the formate is improper
+    except:
+        return None
+
+    return title, audio_length, description, publication_data, episode_id, link_to_audio, podcast_id
+
+
+# Bytes read at a time when counting quotes and looking for a cut
+READ_BLOCK_SIZE = 1 << 20
+
+
+def count_quotes(file_pathway: str, start: int, end: int) -> int:
+    """Counts the quote characters in one byte range of a file. Runs in a worker process.
+
+    A quote byte never occurs inside a multi-byte UTF-8 character, so the bytes can be counted
+    without decoding them."""
+    quotes = 0
+    with open(file_pathway, 'rb') as csv_file:
+        csv_file.seek(start)
+        while start < end:
+            block = csv_file.read(min(READ_BLOCK_SIZE, end - start))
+            if not block:
+                break
+            quotes += block.count(b'"')
+            start += len(block)
+    return quotes
+
+
+def header_end(csv_file) -> int:
+    # The header record ends at the first line break after an even number of quotes
+    offset = 0
+    in_quotes = False
+    for line in csv_file:
+        offset += len(line)
+        if line.count(b'"') % 2 == 1:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            break
+    return offset
+
+
+def next_record_start(csv_file, offset: int, in_quotes: bool, end: int) -> int:
+    """Returns the offset right after the first line break at or after offset that is outside
+    quotes, given whether offset itself is inside a quoted field."""
+    csv_file.seek(offset)
+    while offset < end:
+        block = csv_file.read(min(READ_BLOCK_SIZE, end - offset))
+        if not block:
+            break
+        position = 0
+        while True:
+            quote = block.find(b'"', position)
+            if in_quotes:
+                if quote < 0:
+                    break
+                in_quotes = False
+            else:
+                line_break = block.find(b'\n', position)
+                if line_break >= 0 and (quote < 0 or line_break < quote):
+                    return offset + line_break + 1
+                if quote < 0:
+                    break
+                in_quotes = True
+            position = quote + 1
+        offset += len(block)
+    return end
+
+
+def split_csv_into_ranges(file_pathway: str, parts: int, map_function=map) -> list[tuple[int, int]]:
+    """Splits a CSV file into at most `parts` byte ranges that start and end on record boundaries.
+
+    The file is cut into evenly sized blocks and the quotes in each block are counted, with
+    map_function, so a process pool can count them in parallel. The parity of the counts up to
+    a block tells whether it starts inside a quoted field, and each cut moves forward to the
+    first line break outside quotes. Quoted fields spanning several lines are therefore never
+    cut in half. The header record is not part of any range."""
+    data_size = os.path.getsize(file_pathway)
+
+    with open(file_pathway, 'rb') as csv_file:
+        start = header_end(csv_file)
+        offsets = [start + (data_size - start) * part // parts for part in range(parts)] + [data_size]
+        quotes = list(map_function(count_quotes, [file_pathway] * parts, offsets[:-1], offsets[1:]))
+
+        boundaries = [start]
+        quotes_before = 0
+        for part in range(1, parts):
+            quotes_before += quotes[part - 1]
+            boundary = next_record_start(csv_file, offsets[part], quotes_before % 2 == 1, data_size)
+            if boundaries[-1] < boundary < data_size:
+                boundaries.append(boundary)
+        boundaries.append(data_size)
+
+    return [(first, last) for first, last in zip(boundaries, boundaries[1:]) if last > first]
+
+
+def parse_episode_range(file_pathway: str, start: int, end: int, encoding: str) -> list[tuple]:
+    """Parses the episode records in one byte range of a CSV file and returns the Episode()
+    arguments of each.
+
+    Runs in a worker process, so the coercion happens there and only plain tuples are sent
+    back. Malformed rows are dropped, the same rows CSVDataReader would skip."""
+    with open(file_pathway, 'rb') as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(end - start)
+
+    # TextIOWrapper decodes and translates newlines exactly like open() does in read_csv
+    episodes = list()
+    for row in csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding=encoding)):
+        fields = episode_fields([item.strip() for item in row])
+        if fields is not None:
+            episodes.append(fields)
+    return episodes
+
+
+class CSVCatalog:
+    """Result of reading the CSV files. It is handed to populate / populate_db and can be
+        dropped afterwards, together with the reader that produced it."""
+
+    def __init__(self, authors: list, categories: list, podcasts: list, episodes: list):
+        self.authors = authors
+        self.categories = categories
+        self.podcasts = podcasts
+        self.episodes = episodes
 
 
 class CSVDataReader:
-    """class variable not associated with any one instance of the class.
-        These static variables are used as temporary memory."""
-    author_id = 1
-    category_id = 1
-    category_dict = dict()
-    author_dict = dict()
-    podcast_list = list()
-    episode_list = list()
-
-    def __init__(self, data_pathway: str):
+
+    def __init__(self, data_pathway: str, workers: int = None):
+        """Instance variables used as temporary memory while the CSV files are read.
+            Every reader starts empty, so building the app twice does not grow them."""
+        # Number of processes used to parse the episodes CSV, INGEST_WORKERS by default
+        if workers is None:
+            workers = int(os.environ.get('INGEST_WORKERS') or 1)
+        self.workers = workers
+
+        self.author_id = 1
+        self.category_id = 1
+        self.category_dict = dict()
+        self.author_dict = dict()
+        self.podcast_list = list()
+        self.episode_list = list()
+
+        # Name -> id maps used to create each distinct author and category only once
+        self.author_ids_by_name = dict()
+        self.category_ids_by_name = dict()
+
         if os.environ.get('REPOSITORY') == 'Database':
             if os.environ.get('TESTING') == 'True':
                 self.podcast_csv_pathway = data_pathway  + '/test_data' + '/podcasts.csv'
@@ -36,6 +186,9 @@ class CSVDataReader:
             self.podcast_csv_pathway = data_pathway / 'podcasts.csv'
             self.episodes_csv_pathway = data_pathway / 'episodes.csv'
 
+    def source_pathways(self) -> list:
+        return [self.podcast_csv_pathway, self.episodes_csv_pathway]
+
     def read_csv(self, file_pathway: str):
         with open(file_pathway) as csv_file:
             csv_reader = csv.reader(csv_file)
@@ -45,106 +198,185 @@ class CSVDataReader:
                 row = [item.strip() for item in row]
                 yield row
 
+    def read_episodes_in_parallel(self, file_pathway: str):
+        """Parses byte ranges of the episodes file in a process pool and yields the episodes
+        ordered by id.
+
+        The merge is deterministic: episodes are sorted by their id, and episodes with the
+        same id keep their order in the file."""
+        encoding = locale.getpreferredencoding(False)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            ranges = split_csv_into_ranges(file_pathway, self.workers, executor.map)
+            parts = executor.map(parse_episode_range, [file_pathway] * len(ranges), [start for start, end in ranges],
+                                 [end for start, end in ranges], [encoding] * len(ranges))
+            episodes = [fields for part in parts for fields in part]
+
+        episodes.sort(key=itemgetter(4))
+        for fields in episodes:
+            yield Episode(*fields)
+
+    def read_episodes(self):
+        # Extra processes only help when there are cores to run them on
+        if (min(self.workers, os.cpu_count() or 1) > 1 and
+                os.path.getsize(self.episodes_csv_pathway) >= PARALLEL_INGEST_BYTES):
+            return self.read_episodes_in_parallel(self.episodes_csv_pathway)
+        return (self.parse_episode(row) for row in self.read_csv(self.episodes_csv_pathway))
+
+    def read_catalog(self) -> CSVCatalog:
+        """Reads both CSV files and returns everything that was loaded."""
+        self.create_podcast()
+        self.load_episodes_into_podcasts()
+        return CSVCatalog(list(self.author_dict.values()), list(self.category_dict.values()),
+                          self.podcast_list, self.episode_list)
+
     # Create Author first before and add their podcasts
     def create_author(self, author_name: str) -> int:
 
-        # Will add author to CSVDataReader.author_dict if not already present
-        if author_name not in CSVDataReader.author_dict.values():
-            author_obj = Author(CSVDataReader.author_id, author_name)
-            CSVDataReader.author_dict[CSVDataReader.author_id] = author_obj
-            CSVDataReader.author_id += 1
-
-            # Will return the ID of the added author.
-            return CSVDataReader.author_id - 1
+        # Will add author to self.author_dict if not already present
+        author_id = self.author_ids_by_name.get(author_name)
+        if author_id is None:
+            author_id = self.author_id
+            self.author_dict[author_id] = Author(author_id, author_name)
+            self.author_ids_by_name[author_name] = author_id
+            self.author_id += 1
 
-        # if present will return the ID of the author.
-        return get_key_for_value(CSVDataReader.author_dict, author_name)
+        # Will return the ID of the new or already present author.
+        return author_id
 
     # Need to create category object before creating podcast
     def create_category(self, category_name: str) -> int:
-        if category_name not in CSVDataReader.category_dict.values():
-            category_obj = Category(CSVDataReader.category_id, category_name)
-            CSVDataReader.category_dict[CSVDataReader.category_id] = category_obj
-            CSVDataReader.category_id += 1
-
-            return CSVDataReader.category_id - 1
-
-        return get_key_for_value(CSVDataReader.category_dict, category_name)
+        category_id = self.category_ids_by_name.get(category_name)
+        if category_id is None:
+            category_id = self.category_id
+            self.category_dict[category_id] = Category(category_id, category_name)
+            self.category_ids_by_name[category_name] = category_id
+            self.category_id += 1
+
+        return category_id
+
+    def parse_podcast(self, row: list) -> Podcast | None:
+        """Builds a Podcast from one CSV row, or returns None if the row is malformed."""
+        try:
+            # Unpack all the information in each row of CSV file
+            podcast_id = int(row[0])
+            title = str(row[1])
+            image = str(row[2])
+            description = str(row[3])
+            language = str(row[4])
+            categories = str(row[5])
+            website = str(row[6])
+            author_name = str(row[7].strip())
+            itunes_id = int(row[8])
+
+            #Will call the create_author function and return the ID of the author in self.author_dict
+            author_id: int = self.create_author(author_name)
+
+        # If Row does not have the correct format or missing information then it will be skipped
+        except:
+            return None
+
+        podcast = Podcast(podcast_id, self.author_dict[author_id],
+                          title, image, description, website, itunes_id, language)
+
+        # Will call the create_category function and return the ID of the category in self.category_dict
+        for category in categories.split("|"):
+            # If category does not exist then it will be created
+            category_id: int = self.create_category(category.strip())
+            podcast.add_category(self.category_dict[category_id])
+
+        return podcast
+
+    def parse_episode(self, row: list) -> Episode | None:
+        """Builds an Episode from one CSV row, or returns None if the row is malformed."""
+        fields = episode_fields(row)
+        if fields is None:
+            return None
+
+        #Creating episode class with unpacked values
+        return Episode(*fields)
 
     def create_podcast(self):
 
         for row in self.read_csv(self.podcast_csv_pathway):
+            podcast = self.parse_podcast(row)
 
-            try:
-                # Unpack all the information in each row of CSV file
-                podcast_id = int(row[0])
-                title = str(row[1])
-                image = str(row[2])
-                description = str(row[3])
-                language = str(row[4])
-                categories = str(row[5])
-                website = str(row[6])
-                author_name = str(row[7].strip())
-                itunes_id = int(row[8])
-
-                #Will call the create_author function and return the ID of the author in CSVDataReader.author_dict
-                author_id: int = self.create_author(author_name)
-
-            # If Row does not have the correct format or missing information then it will be skipped
-            except:
-                pass
+            if podcast is not None:
+                # Will add the podcast to the author object
+                podcast.author.add_podcast(podcast)
 
-            else:
-                podcast = Podcast(podcast_id, CSVDataReader.author_dict[author_id],
-                                  title, image, description, website, itunes_id, language)
+                #Will add the podcast to the podcast list
+                self.podcast_list.append(podcast)
 
-                # Will call the create_category function and return the ID of the category in CSVDataReader.category_dict
-                for category in categories.split("|"):
-                    # If category does not exist then it will be created
-                    category_id: int = self.create_category(category.strip())
-                    podcast.add_category(CSVDataReader.category_dict[category_id])
+    def load_episodes_into_podcasts(self):
 
-                # Will add the podcast to the author object
-                CSVDataReader.author_dict[author_id].add_podcast(podcast)
+        # Lookup table built once so each episode row finds its podcast in O(1).
+        # The first podcast with a given id wins, as list.index() used to return.
+        podcast_by_id = dict()
+        for podcast in self.podcast_list:
+            podcast_by_id.setdefault(podcast.id, podcast)
 
-                #Will add the podcast to the podcast list and sort the podcast list based on title
-                (CSVDataReader.podcast_list.append(podcast))
+        # Episodes grouped per podcast in a single pass over the CSV file
+        episodes_by_podcast = dict()
 
-        """    if len(CSVDataReader.podcast_list) > 4:
-                    CSVDataReader.podcast_list.sort()"""
+        for episode in self.read_episodes():
+            if episode is not None:
+                #Episodes lists which is used to populate the database
+                self.episode_list.append(episode)
 
-    def load_episodes_into_podcasts(self):
+                # Episodes of podcasts that do not exist in the podcast list are not attached
+                if episode.podcast_id in podcast_by_id:
+                    episodes_by_podcast.setdefault(episode.podcast_id, []).append(episode)
 
-        for row in self.read_csv(self.episodes_csv_pathway):
+        """Adds the episodes to the corresponding podcast in the podcast list
+        and sorts each episodes list once in ascending order of episode_id"""
+        for podcast_id, episodes in episodes_by_podcast.items():
+            podcast_episodes = podcast_by_id[podcast_id].get_episodes
+            podcast_episodes.extend(episodes)
+            podcast_episodes.sort()
 
-            try:
-                #Unpacking each row of information
-                episode_id = int(row[0])
-                podcast_id = int(row[1])
-                title = str(row[2])
-                link_to_audio = str(row[3])
-                audio_length = str(row[4])
-                description = str(row[5])
-                publication_data = str(row[6])
+    def iter_podcast_chunks(self, chunk_size: int):
+        """Streams the podcasts CSV in chunks of at most chunk_size podcasts.
 
-            #Will pass the row if the formate is improper
-            except:
-                pass
+        Yields (authors, categories, podcasts) where authors and categories are the ones first
+        seen in that chunk. Podcasts are not kept on the reader or on their author, so only the
+        current chunk and the distinct authors and categories stay in memory."""
+        podcasts = list()
+        first_author_id, first_category_id = self.author_id, self.category_id
 
-            else:
-                #Creating episode class with unpacked values
-                episode = Episode(title, audio_length, description, publication_data,
-                                  episode_id, link_to_audio, podcast_id)
+        for row in self.read_csv(self.podcast_csv_pathway):
+            podcast = self.parse_podcast(row)
+            if podcast is None:
+                continue
 
-                #Episodes lists which is used to populate the database
-                CSVDataReader.episode_list.append(episode)
+            podcasts.append(podcast)
+            if len(podcasts) >= chunk_size:
+                yield (self.authors_since(first_author_id), self.categories_since(first_category_id), podcasts)
+                podcasts = list()
+                first_author_id, first_category_id = self.author_id, self.category_id
+
+        if podcasts:
+            yield (self.authors_since(first_author_id), self.categories_since(first_category_id), podcasts)
+
+    def iter_episode_chunks(self, chunk_size: int):
+        """Streams the episodes CSV in lists of at most chunk_size episodes."""
+        episodes = list()
+
+        for row in self.read_csv(self.episodes_csv_pathway):
+            episode = self.parse_episode(row)
+            if episode is None:
+                continue
+
+            episodes.append(episode)
+            if len(episodes) >= chunk_size:
+                yield episodes
+                episodes = list()
+
+        if episodes:
+            yield episodes
 
-                #Finds the index of podcast and adds the episode into the podcast episodes
-                for podcast in CSVDataReader.podcast_list:
-                    if podcast._id == podcast_id:
-                        podcast_index = CSVDataReader.podcast_list.index(podcast)
+    def authors_since(self, author_id: int) -> list[Author]:
+        return [self.author_dict[new_id] for new_id in range(author_id, self.author_id)]
 
-                """Adds the episode to the corresponding podcast in the CSVDataReader.podcast_list
-                and sorts the episodes list in ascending order of episode_id"""
-                (CSVDataReader.podcast_list[podcast_index]).add_episode(episode)
-                CSVDataReader.podcast_list[podcast_index].get_episodes.sort()
+    def categories_since(self, category_id: int) -> list[Category]:
+        return [self.category_dict[new_id] for new_id in range(category_id, self.category_id)]
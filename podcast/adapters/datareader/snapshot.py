@@ -0,0 +1,132 @@
+"""Binary snapshot of the catalog read from the CSV files.
+
+Parsing the CSV files on every start is slow, so the catalog built by CSVDataReader is
+written to a snapshot file after the first parse. Later starts load the snapshot instead,
+as long as it was written by the same snapshot version and the CSV files have not changed.
+
+File layout:
+    MAGIC (8 bytes) | version (uint16) | header length (uint32) | header | catalog
+The header is a pickled dict describing the source files (name, size, mtime, sha256) and the
+catalog is the pickled CSVCatalog.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import struct
+import sys
+
+from podcast.adapters.datareader.csvdatareader import CSVDataReader, CSVCatalog
+
+SNAPSHOT_MAGIC = b'PODCAST\x00'
+# Bump whenever the domain model or CSVCatalog layout changes, old snapshots are then ignored
+SNAPSHOT_VERSION = 1
+PREFIX = struct.Struct('<8sHI')
+
+
+def file_sha256(file_pathway) -> str:
+    digest = hashlib.sha256()
+    with open(file_pathway, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_sources(source_pathways: list) -> list[dict]:
+    sources = list()
+    for source_pathway in source_pathways:
+        stat = os.stat(source_pathway)
+        sources.append({'name': os.path.basename(source_pathway), 'size': stat.st_size,
+                        'mtime': stat.st_mtime_ns, 'sha256': file_sha256(source_pathway)})
+    return sources
+
+
+def sources_unchanged(recorded_sources: list[dict], source_pathways: list) -> bool:
+    """Size and mtime are compared first. The hash is only computed when they differ,
+    so touching a file without changing it does not invalidate the snapshot."""
+    if len(recorded_sources) != len(source_pathways):
+        return False
+
+    for recorded, source_pathway in zip(recorded_sources, source_pathways):
+        stat = os.stat(source_pathway)
+        if recorded['name'] != os.path.basename(source_pathway) or recorded['size'] != stat.st_size:
+            return False
+        if recorded['mtime'] != stat.st_mtime_ns and recorded['sha256'] != file_sha256(source_pathway):
+            return False
+    return True
+
+
+def touched_sources(recorded_sources: list[dict], source_pathways: list) -> list[dict] | None:
+    """Returns the recorded sources with their current mtimes if any mtime changed, or None.
+    Only called once the sources are known to be unchanged, so the hashes still hold."""
+    current = list()
+    for recorded, source_pathway in zip(recorded_sources, source_pathways):
+        current.append(dict(recorded, mtime=os.stat(source_pathway).st_mtime_ns))
+    return current if current != recorded_sources else None
+
+
+def write_snapshot(snapshot_pathway, catalog: CSVCatalog, source_pathways: list):
+    write_snapshot_file(snapshot_pathway, describe_sources(source_pathways),
+                        pickle.dumps(catalog, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def write_snapshot_file(snapshot_pathway, sources: list[dict], body: bytes):
+    header = pickle.dumps({'python': sys.version_info[:2], 'sources': sources}, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Written to a temporary file first so a concurrent start never sees half a snapshot
+    temporary_pathway = f'{snapshot_pathway}.{os.getpid()}.tmp'
+    with open(temporary_pathway, 'wb') as snapshot_file:
+        snapshot_file.write(PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        snapshot_file.write(header)
+        snapshot_file.write(body)
+    os.replace(temporary_pathway, snapshot_pathway)
+
+
+def read_snapshot(snapshot_pathway, source_pathways: list) -> CSVCatalog | None:
+    """Returns the catalog stored in the snapshot, or None if it is missing, stale or unreadable."""
+    try:
+        with open(snapshot_pathway, 'rb') as snapshot_file:
+            magic, version, header_length = PREFIX.unpack(snapshot_file.read(PREFIX.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                return None
+
+            header = pickle.loads(snapshot_file.read(header_length))
+            if tuple(header['python']) != sys.version_info[:2]:
+                return None
+            if not sources_unchanged(header['sources'], source_pathways):
+                return None
+
+            body = snapshot_file.read()
+            catalog = pickle.loads(body)
+
+    except (OSError, EOFError, AttributeError, ImportError, KeyError, TypeError, ValueError, struct.error,
+            pickle.UnpicklingError):
+        return None
+
+    # A touched but unchanged file was hashed to find that out. Its new mtime is recorded, so
+    # the following starts can skip the hash again.
+    sources = touched_sources(header['sources'], source_pathways)
+    if sources is not None:
+        try:
+            write_snapshot_file(snapshot_pathway, sources, body)
+        except OSError as error:
+            print(f'Catalog snapshot could not be updated: {error}')
+    return catalog
+
+
+def load_catalog(data_pathway, snapshot_pathway) -> CSVCatalog:
+    """Loads the catalog from the snapshot if it is up to date, otherwise parses the CSV
+    files and writes a new snapshot for the next start."""
+    reader = CSVDataReader(data_pathway)
+    source_pathways = reader.source_pathways()
+
+    catalog = read_snapshot(snapshot_pathway, source_pathways)
+    if catalog is None:
+        catalog = reader.read_catalog()
+        try:
+            write_snapshot(snapshot_pathway, catalog, source_pathways)
+        except OSError as error:
+            # A read-only data directory only costs the next start a CSV parse
+            print(f'Catalog snapshot could not be written: {error}')
+    return catalog
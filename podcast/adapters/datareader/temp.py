@@ -6,7 +6,7 @@ def x():
     reader.create_podcast()
     reader.load_episodes_into_podcasts()
 
-    for podcast in CSVDataReader.podcast_list:
+    for podcast in reader.podcast_list:
         print("\n\n")
         print(podcast)
         break
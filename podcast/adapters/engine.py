@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+
+# DATABASE_POOL values. 'queue' keeps up to pool_size connections open for reuse, 'static' shares
+# one connection between all requests and 'null' opens a connection per checkout.
+# Requests sharing one connection also share its transaction, so one request's commit or rollback
+# would end another's writes. 'static' is therefore only accepted for in-memory SQLite databases,
+# which exist only inside their one connection and are used for tests.
+POOL_CLASSES = {
+    'queue': QueuePool,
+    'static': StaticPool,
+    'null': NullPool,
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers carry on while another connection writes, and with WAL a commit only
+    # has to reach the log, so NORMAL sync is still safe against corruption
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def is_memory_database(database_uri: str) -> bool:
+    return database_uri in ('sqlite://', 'sqlite:///:memory:')
+
+
+def create_database_engine(database_uri: str, pool: str = 'queue', pool_size: int = 5):
+    """Creates the engine shared by every request, with the connection pool named by pool."""
+    if pool not in POOL_CLASSES:
+        raise ValueError(f'DATABASE_POOL must be one of {", ".join(POOL_CLASSES)}, not {pool}')
+    if pool == 'static' and not is_memory_database(database_uri):
+        raise ValueError('DATABASE_POOL static is only for in-memory SQLite databases, use queue or null')
+
+    options = dict()
+    if pool == 'queue':
+        options['pool_size'] = pool_size
+        options['max_overflow'] = pool_size
+
+    database_engine = create_engine(database_uri, connect_args={"check_same_thread": False},
+                                    poolclass=POOL_CLASSES[pool], echo=False, **options)
+    if database_engine.dialect.name == 'sqlite':
+        event.listen(database_engine, 'connect', set_sqlite_pragmas)
+    return database_engine
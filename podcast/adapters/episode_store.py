@@ -0,0 +1,231 @@
+"""Column-oriented, memory-mapped storage for the catalog's episodes.
+
+Keeping every Episode as a Python object costs several hundred bytes per episode plus its
+multi-kilobyte description, in every worker. The episode store writes the episodes to one
+file and maps it read-only, so the operating system shares its pages between forked workers.
+
+File layout (little endian):
+    header   MAGIC (8 bytes) | version (uint32) | sources length (uint32) | episode count n (uint64) | padding
+    sources  utf-8 JSON list describing the CSV files the store was built from (name, size,
+             mtime, sha256), padded with zero bytes to a multiple of 8
+    columns  episode_id int64[n] | podcast_id int64[n] | length int64[n]
+    strings  for name, description, publication date and audio link: offsets uint64[n + 1]
+    blob     utf-8 bytes of every string column, addressed by the offsets
+Rows are sorted by (podcast_id, episode_id), so a podcast's episodes are one contiguous range.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+
+from podcast.adapters.datareader.snapshot import describe_sources, sources_unchanged
+from podcast.domainmodel.model import Episode
+
+STORE_MAGIC = b'PODEPIS\x00'
+STORE_VERSION = 2
+HEADER = struct.Struct('<8sIIQ8x')
+
+NAME, DESCRIPTION, PUBLICATION_DATE, LINK_TO_AUDIO = range(4)
+STRING_COLUMNS = 4
+
+
+def episode_length(episode: Episode) -> int:
+    # The CSV reader keeps the length as it was written, and the column only holds integers
+    try:
+        return int(episode.epi_length)
+    except (TypeError, ValueError):
+        return 0
+
+
+def write_episode_store(store_pathway, episodes: list[Episode], source_pathways: list = ()):
+    rows = sorted(episodes, key=lambda episode: (episode.podcast_id, episode.episode_id))
+    count = len(rows)
+
+    blob = bytearray()
+    offsets = list()
+    for column in (lambda episode: episode.episode_name, lambda episode: episode.episode_description,
+                   lambda episode: episode.publication_date, lambda episode: episode.link_to_audio):
+        column_offsets = [len(blob)]
+        for episode in rows:
+            blob += str(column(episode)).encode('utf-8')
+            column_offsets.append(len(blob))
+        offsets.append(column_offsets)
+
+    sources = json.dumps(describe_sources(source_pathways)).encode('utf-8')
+    sources += bytes(-len(sources) % 8)
+
+    # Written to a temporary file first so a running worker never maps half a store
+    temporary_pathway = f'{store_pathway}.{os.getpid()}.tmp'
+    with open(temporary_pathway, 'wb') as store_file:
+        store_file.write(HEADER.pack(STORE_MAGIC, STORE_VERSION, len(sources), count))
+        store_file.write(sources)
+        store_file.write(struct.pack(f'<{count}q', *(episode.episode_id for episode in rows)))
+        store_file.write(struct.pack(f'<{count}q', *(episode.podcast_id for episode in rows)))
+        store_file.write(struct.pack(f'<{count}q', *(episode_length(episode) for episode in rows)))
+        for column_offsets in offsets:
+            store_file.write(struct.pack(f'<{count + 1}Q', *column_offsets))
+        store_file.write(blob)
+    os.replace(temporary_pathway, store_pathway)
+
+
+class EpisodeStore:
+    """Read-only, memory-mapped view of a file written by write_episode_store."""
+
+    def __init__(self, store_pathway):
+        with open(store_pathway, 'rb') as store_file:
+            self._map = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, sources_length, count = HEADER.unpack_from(self._map)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            raise ValueError(f'{store_pathway} is not an episode store of version {STORE_VERSION}.')
+
+        self._count = count
+        view = memoryview(self._map)
+        position = HEADER.size + sources_length
+        self.episode_ids = view[position:position + 8 * count].cast('q')
+        position += 8 * count
+        self.podcast_ids = view[position:position + 8 * count].cast('q')
+        position += 8 * count
+        self.lengths = view[position:position + 8 * count].cast('q')
+        position += 8 * count
+
+        self._offsets = list()
+        for column in range(STRING_COLUMNS):
+            self._offsets.append(view[position:position + 8 * (count + 1)].cast('Q'))
+            position += 8 * (count + 1)
+        self._blob_start = position
+
+    def __len__(self) -> int:
+        return self._count
+
+    def string(self, column: int, row: int) -> str:
+        offsets = self._offsets[column]
+        start = self._blob_start + offsets[row]
+        return self._map[start:self._blob_start + offsets[row + 1]].decode('utf-8')
+
+    def episodes_for_podcast(self, podcast_id: int) -> EpisodeRange:
+        low = bisect_left(self.podcast_ids, podcast_id)
+        high = bisect_right(self.podcast_ids, podcast_id, low)
+        return EpisodeRange(self, low, high)
+
+
+class EpisodeView(Episode):
+    """Lightweight Episode backed by one row of an EpisodeStore. Fields are decoded on access."""
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: EpisodeStore, row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def episode_id(self) -> int:
+        return self._store.episode_ids[self._row]
+
+    @property
+    def podcast_id(self) -> int:
+        return self._store.podcast_ids[self._row]
+
+    @property
+    def epi_length(self) -> int:
+        return self._store.lengths[self._row]
+
+    @property
+    def episode_name(self) -> str:
+        return self._store.string(NAME, self._row)
+
+    @property
+    def episode_description(self) -> str:
+        return self._store.string(DESCRIPTION, self._row)
+
+    @property
+    def publication_date(self) -> str:
+        return self._store.string(PUBLICATION_DATE, self._row)
+
+    @property
+    def link_to_audio(self) -> str:
+        return self._store.string(LINK_TO_AUDIO, self._row)
+
+    def __hash__(self):
+        return hash((self.episode_id, self.episode_name))
+
+
+class EpisodeRange(Sequence):
+    """A podcast's episodes in an EpisodeStore, in ascending order of episode_id."""
+
+    def __init__(self, store: EpisodeStore, low: int, high: int):
+        self._store = store
+        self._low = low
+        self._high = high
+
+    def __len__(self) -> int:
+        return self._high - self._low
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Episode index out of range.')
+        return EpisodeView(self._store, self._low + index)
+
+    def find(self, episode_id: int) -> EpisodeView | None:
+        row = bisect_left(self._store.episode_ids, episode_id, self._low, self._high)
+        if row < self._high and self._store.episode_ids[row] == episode_id:
+            return EpisodeView(self._store, row)
+        return None
+
+    def __eq__(self, other):
+        if isinstance(other, (EpisodeRange, list)):
+            return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<EpisodeRange of {len(self)} episodes>"
+
+
+def read_store_header(store_pathway) -> tuple[list[dict], int] | None:
+    """Returns the sources and episode count recorded in a store, or None if it is missing or
+    not a store of the current version."""
+    try:
+        with open(store_pathway, 'rb') as store_file:
+            magic, version, sources_length, count = HEADER.unpack(store_file.read(HEADER.size))
+            if magic != STORE_MAGIC or version != STORE_VERSION:
+                return None
+            return json.loads(store_file.read(sources_length).rstrip(b'\x00')), count
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def store_is_current(store_pathway, source_pathways: list, episode_count: int = None) -> bool:
+    """A store is current when it was built from CSV files of the same size and contents, and
+    holds episode_count episodes. Like the catalog snapshot, a file is only hashed when its
+    mtime changed, so a store copied in or built from other files is never reused."""
+    header = read_store_header(store_pathway)
+    if header is None:
+        return False
+    sources, count = header
+    if episode_count is not None and count != episode_count:
+        return False
+    return sources_unchanged(sources, source_pathways)
+
+
+def move_episodes_to_store(catalog, store_pathway, source_pathways: list) -> EpisodeStore:
+    """Moves the catalog's episodes into the episode store at store_pathway.
+
+    The store file is rewritten unless it was built from the same CSV files and holds as many
+    episodes as the catalog.
+    Every podcast's episode list is then replaced by a range of the store, and the Episode
+    objects are released."""
+    if not store_is_current(store_pathway, source_pathways, len(catalog.episodes)):
+        write_episode_store(store_pathway, catalog.episodes, source_pathways)
+
+    store = EpisodeStore(store_pathway)
+    for podcast in catalog.podcasts:
+        podcast.episodes = store.episodes_for_podcast(podcast.id)
+    catalog.episodes = list()
+    return store
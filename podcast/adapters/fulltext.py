@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from podcast.adapters.search import FIELD_WEIGHTS, SEARCH_FIELDS, tokenize
+
+# SQLite FTS5 table mirroring the searchable podcast columns, keyed by podcast id as rowid.
+# It is not part of the ORM metadata, so it is created and filled separately.
+SEARCH_TABLE = 'podcast_search'
+
+CREATE_SEARCH_TABLE = text(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    f"USING fts5({', '.join(FIELD_WEIGHTS)}, tokenize='unicode61')"
+)
+
+# One row per podcast, with its category names joined into a single column
+SELECT_SEARCH_ROWS = """
+    SELECT podcasts.podcast_id, podcasts.podcast_title, authors.author_name,
+           group_concat(categories.category_name, ' '), podcasts.podcast_description
+    FROM podcasts
+    LEFT JOIN authors ON authors.author_id = podcasts.author_id
+    LEFT JOIN podcast_categories ON podcast_categories.podcast_id = podcasts.podcast_id
+    LEFT JOIN categories ON categories.category_id = podcast_categories.category_id
+"""
+
+INSERT_SEARCH_ROWS = f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(FIELD_WEIGHTS)}) {SELECT_SEARCH_ROWS}"
+
+
+def search_query(filter_by: str):
+    # bm25() takes one weight per column, in column order. It scores matches in every column,
+    # even ones a column filter excludes, so columns that are not searched weigh nothing.
+    columns = SEARCH_FIELDS.get(filter_by, SEARCH_FIELDS['all'])
+    weights = ', '.join(str(weight if field in columns else 0.0) for field, weight in FIELD_WEIGHTS.items())
+    return text(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+                f"ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid LIMIT :limit OFFSET :offset")
+
+
+COUNT_QUERY = text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match")
+
+
+def search_table_exists(connection) -> bool:
+    if connection.dialect.name != 'sqlite':
+        return False
+    row = connection.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                             {'name': SEARCH_TABLE}).first()
+    return row is not None
+
+
+def rebuild_search_table(connection) -> bool:
+    """Creates the search table if needed and refills it from the podcast tables.
+
+    Returns False when the database cannot hold one (not SQLite, or SQLite built without FTS5)."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        connection.execute(CREATE_SEARCH_TABLE)
+    except OperationalError:
+        return False
+    connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    connection.execute(text(f"{INSERT_SEARCH_ROWS} GROUP BY podcasts.podcast_id"))
+    return True
+
+
+# Podcast ids bound per statement when search rows are refreshed, well below SQLite's limit
+# on host parameters
+REFRESH_BATCH_SIZE = 500
+
+
+def refresh_search_rows(connection, podcast_ids):
+    """Rewrites the search rows of the given podcasts after they were added or changed."""
+    podcast_ids = list(podcast_ids)
+    for start in range(0, len(podcast_ids), REFRESH_BATCH_SIZE):
+        batch = podcast_ids[start:start + REFRESH_BATCH_SIZE]
+        parameters = {f'id_{position}': podcast_id for position, podcast_id in enumerate(batch)}
+        placeholders = ', '.join(f':{name}' for name in parameters)
+        connection.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})"), parameters)
+        connection.execute(text(f"{INSERT_SEARCH_ROWS} WHERE podcasts.podcast_id IN ({placeholders}) "
+                                f"GROUP BY podcasts.podcast_id"), parameters)
+
+
+def match_expression(query: str, filter_by: str = 'all', prefix: bool = True) -> str | None:
+    """Turns a search box query into an FTS5 MATCH expression.
+
+    Every term has to match and the last one is matched as a prefix. A query wrapped in
+    double quotes is matched as a phrase instead. Terms are quoted, so FTS5 operators typed
+    into the search box are searched for as words. Returns None for a query without terms."""
+    terms = tokenize(query)
+    if not terms:
+        return None
+    stripped = query.strip()
+    star = '*' if prefix else ''
+    if len(stripped) > 1 and stripped.startswith('"') and stripped.endswith('"'):
+        expression = f'"{" ".join(terms)}"{star}'
+    else:
+        expression = ' '.join(f'"{term}"' for term in terms[:-1])
+        expression = f'{expression} "{terms[-1]}"{star}'.strip()
+    columns = SEARCH_FIELDS.get(filter_by, SEARCH_FIELDS['all'])
+    return f'{{{" ".join(columns)}}} : ({expression})'
+
+
+def search_podcast_ids(connection, query: str, filter_by: str = 'all', prefix: bool = True, offset: int = 0,
+                      limit: int = None) -> list[int]:
+    expression = match_expression(query, filter_by, prefix)
+    if expression is None:
+        return []
+    # SQLite reads a negative limit as no limit
+    parameters = {'match': expression, 'offset': offset, 'limit': -1 if limit is None else limit}
+    return list(connection.execute(search_query(filter_by), parameters).scalars())
+
+
+def count_matches(connection, query: str, filter_by: str = 'all', prefix: bool = True) -> int:
+    expression = match_expression(query, filter_by, prefix)
+    if expression is None:
+        return 0
+    return connection.execute(COUNT_QUERY, {'match': expression}).scalar()
@@ -1,50 +1,216 @@
-from bisect import insort_left
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort_left
 from typing import List, Iterable
 
 
-from podcast.adapters.repository import AbstractRepository
-from podcast.domainmodel.model import Podcast, User
-from podcast.adapters.datareader.csvdatareader import CSVDataReader
+from podcast.adapters.repository import (AbstractRepository, RepositoryException, Page, RatingSummary,
+                                         podcast_sort_key)
+from podcast.adapters.cache import QueryCache, search_cache_key
+from podcast.adapters.search import (FUZZY, SUGGESTIONS, FuzzyIndex, SearchIndex, SuggestionIndex,
+                                     suggestion_entries)
+from podcast.domainmodel.model import Podcast, User, Author
+from podcast.adapters.datareader.csvdatareader import CSVDataReader, CSVCatalog
 
 
 class MemoryRepository(AbstractRepository):
 
-    def __init__(self):
+    def __init__(self, search_cache: QueryCache = None):
         self.__podcast = list()
         self.__users = list()
-
+        self.__frozen = False
+
+        # Secondary indexes, kept up to date by add_podcast and add_user
+        self.__podcasts_by_id = dict()
+        self.__podcasts_by_title = dict()
+        self.__podcasts_by_author = dict()
+        self.__podcasts_by_category = dict()
+        self.__users_by_name = dict()
+        self.__search_index = SearchIndex()
+        self.__fuzzy_index = FuzzyIndex()
+        # Ordered result ids of recent searches, so paging through them does not search again
+        self.__search_cache = search_cache
+        # Names suggested as a search is typed, built once the catalog is loaded
+        self.__suggestions = None
+        # Podcasts in id order for paging, built when first needed
+        self.__podcasts_in_id_order = None
 
     @property
     def users(self):
         return self.__users
 
+    @property
+    def search_cache(self) -> QueryCache | None:
+        return self.__search_cache
+
+    @property
+    def frozen(self) -> bool:
+        return self.__frozen
+
+    def freeze(self):
+        """Makes the catalog read-only before worker processes are forked.
+
+        Podcast, category, episode and author lists become tuples, so nothing can resize or
+        rewrite them after the fork and the pages holding them stay shared. Users can still
+        be added."""
+        for podcast in self.__podcast:
+            podcast.categories = tuple(podcast.categories)
+            if isinstance(podcast.episodes, list):
+                podcast.episodes = tuple(podcast.episodes)
+            if isinstance(podcast.author.podcast_list, list):
+                podcast.author.podcast_list = tuple(podcast.author.podcast_list)
+        self.__podcast = tuple(self.__podcast)
+        for index in (self.__podcasts_by_author, self.__podcasts_by_category):
+            for key, podcasts in index.items():
+                index[key] = tuple(podcasts)
+        self.__search_index.sort_terms()
+        self.__podcasts_in_id_order = tuple(self.podcasts_sorted_by('id'))
+        if self.__suggestions is None:
+            self.build_suggestion_index()
+        self.__frozen = True
+
     def add_podcast(self, podcast: Podcast):
-        if isinstance(podcast, Podcast):
-            insort_left(self.__podcast, podcast)
+        if self.__frozen:
+            raise RepositoryException('Podcasts cannot be added to a frozen repository.')
+        # The first podcast added with an id keeps it, as CSVDataReader attaches episodes to the
+        # first one. Later podcasts with that id are left out of every list and index.
+        if isinstance(podcast, Podcast) and podcast.id not in self.__podcasts_by_id:
+            insort_left(self.__podcast, podcast, key=podcast_sort_key)
+
+            self.__podcasts_by_id[podcast.id] = podcast
+            self.__podcasts_in_id_order = None
+            # The first podcast added with a title keeps it
+            self.__podcasts_by_title.setdefault(podcast.title, podcast)
+            # Author and category lists are kept in the same (title, id) order as the podcast list
+            if isinstance(podcast.author, Author):
+                insort_left(self.__podcasts_by_author.setdefault(podcast.author.id, list()), podcast,
+                            key=podcast_sort_key)
+            for category in podcast.categories:
+                insort_left(self.__podcasts_by_category.setdefault(category.id, list()), podcast,
+                            key=podcast_sort_key)
+            self.__search_index.add_podcast(podcast)
+            self.__fuzzy_index.add_podcast(podcast)
+            self.__suggestions = None
+            if self.__search_cache is not None:
+                self.__search_cache.clear()
 
     def get_podcasts(self):
         return self.__podcast
 
+    def get_podcast_by_id(self, podcast_id: int) -> Podcast | None:
+        return self.__podcasts_by_id.get(podcast_id)
+
+    def get_podcast_by_title(self, podcast_title: str) -> Podcast | None:
+        return self.__podcasts_by_title.get(podcast_title)
+
+    def get_podcast_details(self, podcast_title: str) -> Podcast | None:
+        return self.__podcasts_by_title.get(podcast_title)
+
+    def get_podcasts_by_author(self, author_id: int) -> list[Podcast]:
+        return list(self.__podcasts_by_author.get(author_id, ()))
+
+    def get_podcasts_by_category(self, category_id: int) -> list[Podcast]:
+        return list(self.__podcasts_by_category.get(category_id, ()))
+
+    def search_podcast_ids(self, query: str, filter_by: str = 'all') -> tuple:
+        def search():
+            if filter_by == FUZZY:
+                return tuple(self.__fuzzy_index.search(query))
+            return tuple(self.__search_index.search(query, filter_by))
+
+        if self.__search_cache is None:
+            return search()
+        return self.__search_cache.get_or_load(search_cache_key(query, filter_by), search)
+
+    def search_podcasts(self, query: str, filter_by: str = 'all') -> list[Podcast]:
+        return [self.__podcasts_by_id[podcast_id] for podcast_id in self.search_podcast_ids(query, filter_by)]
+
+    def search_podcasts_page(self, query: str, filter_by: str, offset: int, limit: int) -> Page:
+        podcast_ids = self.search_podcast_ids(query, filter_by)
+        return Page([self.__podcasts_by_id[podcast_id] for podcast_id in podcast_ids[offset:offset + limit]],
+                    len(podcast_ids))
+
+    def build_suggestion_index(self):
+        self.__suggestions = SuggestionIndex(suggestion_entries(self.__podcast))
+
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS) -> list[tuple[str, str]]:
+        if self.__suggestions is None:
+            self.build_suggestion_index()
+        return self.__suggestions.suggest(prefix, limit)
+
+    def podcasts_sorted_by(self, sort: str):
+        if sort == 'title':
+            # The podcast list itself is kept in title order
+            return self.__podcast
+        if sort == 'id':
+            if self.__podcasts_in_id_order is None:
+                self.__podcasts_in_id_order = [self.__podcasts_by_id[podcast_id]
+                                               for podcast_id in sorted(self.__podcasts_by_id)]
+            return self.__podcasts_in_id_order
+        raise RepositoryException(f'Podcasts cannot be sorted by {sort}')
+
+    def get_podcasts_page(self, offset: int, limit: int, sort: str = 'title', after: tuple = None,
+                          before: tuple = None, last: bool = False) -> Page:
+        podcasts = self.podcasts_sorted_by(sort)
+
+        def sort_key(podcast):
+            return podcast_sort_key(podcast, sort)
+
+        # Cursors are found by bisecting the sorted list, so deep pages cost the same as the first
+        if after is not None:
+            start = bisect_right(podcasts, tuple(after), key=sort_key)
+        elif before is not None:
+            end = bisect_left(podcasts, tuple(before), key=sort_key)
+            return Page(list(podcasts[max(end - limit, 0):end]), len(podcasts))
+        elif last:
+            start = max(len(podcasts) - limit, 0)
+        else:
+            start = offset
+        return Page(list(podcasts[start:start + limit]), len(podcasts))
+
+    def get_rating_summary(self, podcast_id: int) -> RatingSummary:
+        podcast = self.__podcasts_by_id.get(podcast_id)
+        if podcast is None:
+            return RatingSummary()
+        return RatingSummary(podcast.rating_count, podcast.rating_sum, podcast.rating_histogram)
+
     def get_number_of_podcasts(self):
         return len(self.__podcast)
 
     def add_user(self, user):
         self.__users.append(user)
+        self.__users_by_name[user.username] = user
 
     def get_user(self, user):
-        for i in range(len(self.__users)):
-            if user.lower().strip() == self.__users[i].username:
-                return self.__users[i]
-        return None
+        return self.__users_by_name.get(user.lower().strip())
+
+    # The first entry of a user's subscription list is their favorited episodes, not a subscription
+    def add_subscription(self, user: User, podcast: Podcast) -> bool:
+        if podcast in user.subscription_list[1:]:
+            return False
+        user.subscription_list.append(podcast)
+        return True
+
+    def remove_subscription(self, user: User, podcast: Podcast) -> bool:
+        subscriptions = user.subscription_list
+        for index in range(1, len(subscriptions)):
+            if subscriptions[index] == podcast:
+                del subscriptions[index]
+                return True
+        return False
+
+    def get_subscriptions(self, user: User) -> list:
+        return user.subscription_list[1:]
 
 
-def populate(repo: MemoryRepository, data_pathway):
-    reader = CSVDataReader(data_pathway)
-    reader.create_podcast()
-    reader.load_episodes_into_podcasts()
+def populate(repo: MemoryRepository, data_pathway, catalog: CSVCatalog = None):
+    # The catalog is read here unless one was already read by the caller
+    if catalog is None:
+        catalog = CSVDataReader(data_pathway).read_catalog()
 
-    for podcast in reader.podcast_list:
+    for podcast in catalog.podcasts:
         repo.add_podcast(podcast)
+    repo.build_suggestion_index()
 
 
 def make_podcast_list_into_dict(podcast_list: list) -> dict:
@@ -0,0 +1,30 @@
+"""Brings an existing database up to the current schema.
+
+Run it against a database file with `python -m podcast.adapters.migrations sqlite:///podcasts.db`.
+Every step checks what is already there first, so it is safe to run more than once."""
+import sys
+
+from sqlalchemy import create_engine, inspect
+
+from podcast.adapters.orm import mapper_registry
+
+
+def upgrade(database_engine) -> list[str]:
+    """Creates missing tables and indexes and returns the names of the indexes created."""
+    mapper_registry.metadata.create_all(database_engine, checkfirst=True)
+
+    created = list()
+    inspector = inspect(database_engine)
+    for table in mapper_registry.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(database_engine)
+                created.append(index.name)
+    return created
+
+
+if __name__ == '__main__':
+    database_uri = sys.argv[1] if len(sys.argv) > 1 else 'sqlite:///podcasts.db'
+    created = upgrade(create_engine(database_uri))
+    print(f'Created indexes: {", ".join(created)}' if created else 'Database is up to date')
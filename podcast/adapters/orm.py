@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Table, Column, Integer, Float, String, DateTime, ForeignKey, Text
+    Table, Column, Integer, Float, String, DateTime, ForeignKey, Text, Index
 )
 from sqlalchemy.orm import registry, relationship
 from datetime import datetime
@@ -27,6 +27,8 @@ podcast_table = Table(
     Column('podcast_itunes_id', Integer, nullable=True),
     Column('comments', Text, nullable=True),
     Column('reviews', Text, nullable=True),
+    # Title lookups, and library pages ordered by (title, id)
+    Index('ix_podcasts_title', 'podcast_title', 'podcast_id'),
 )
 
 categories_table = Table(
@@ -40,6 +42,9 @@ podcast_categories_table = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('podcast_id', ForeignKey('podcasts.podcast_id')),
     Column('category_id', ForeignKey('categories.category_id')),
+    # Categories of a podcast, and podcasts in a category
+    Index('ix_podcast_categories_podcast', 'podcast_id', 'category_id'),
+    Index('ix_podcast_categories_category', 'category_id', 'podcast_id'),
 )
 
 user_to_favorite_podcasts = Table(
@@ -59,23 +64,47 @@ episodes_table = Table(
     Column('episode_description', String(255), nullable=True),
     Column('episode_date', Text, nullable=True),
     Column('episode_link', Text, nullable=True),
+    Index('ix_episodes_podcast', 'podcast_id'),
 )
 
 user_table = Table(
     'users', mapper_registry.metadata,
     Column('user_id', Integer, primary_key=True, autoincrement=True),
+    # The unique constraint also gives user_name lookups an index
     Column('user_name', String(255), unique=True),
     Column('user_password', String(255)),
+    # No longer written: subscriptions are kept in user_subscriptions, one row each
     Column('subscription_list', Text, nullable=True)
 )
 
+# The podcasts a user subscribes to. The primary key serves lookups by user; the podcast index
+# serves lookups and deletes by podcast.
+user_subscriptions_table = Table(
+    'user_subscriptions', mapper_registry.metadata,
+    Column('user_id', ForeignKey('users.user_id'), primary_key=True),
+    Column('podcast_id', ForeignKey('podcasts.podcast_id'), primary_key=True),
+    Column('subscribed_at', DateTime, nullable=False, default=datetime.now),
+    Index('ix_user_subscriptions_podcast', 'podcast_id'),
+)
+
 reviews_table = Table(
     'reviews', mapper_registry.metadata,
     Column('review_id', Integer, primary_key=True, autoincrement=True),
     Column('user_id', ForeignKey('users.user_id')),
     Column('podcast_id', ForeignKey('podcasts.podcast_id')),
     Column('rating', Integer),
-    Column('comment', Text)
+    Column('comment', Text),
+    Index('ix_reviews_podcast', 'podcast_id'),
+)
+
+# Optional per-podcast rating totals, kept up to date by add_review when enabled, so ratings can be
+# shown without reading the reviews. rating_1 to rating_5 count the ratings in each whole-star bucket.
+rating_summary_table = Table(
+    'podcast_rating_summary', mapper_registry.metadata,
+    Column('podcast_id', ForeignKey('podcasts.podcast_id'), primary_key=True),
+    Column('review_count', Integer, nullable=False, default=0),
+    Column('rating_sum', Float, nullable=False, default=0),
+    *[Column(f'rating_{stars}', Integer, nullable=False, default=0) for stars in range(1, 6)],
 )
 
 playlist_table = Table(
@@ -97,7 +126,6 @@ def map_model_to_tables():
         '_id': user_table.c.user_id,
         '_username': user_table.c.user_name,
         '_password': user_table.c.user_password,
-        '_subscription_list': user_table.c.subscription_list
     })
 
     mapper_registry.map_imperatively(Podcast, podcast_table, properties={
@@ -109,7 +137,7 @@ def map_model_to_tables():
         '_website': podcast_table.c.podcast_website_url,
         '_itunes_id': podcast_table.c.podcast_itunes_id,
         '_author': relationship(Author),
-        '_Podcast_episodes': relationship(Episode, back_populates='_Episode_podcast'),
+        'episodes': relationship(Episode, back_populates='_Episode_podcast', order_by=episodes_table.c.episode_id),
         'categories': relationship(Category, secondary=podcast_categories_table),
         '_comment_section': podcast_table.c.comments,
         '_user_reviews': podcast_table.c.reviews
@@ -123,7 +151,7 @@ def map_model_to_tables():
 
     mapper_registry.map_imperatively(Episode, episodes_table, properties={
         '_episode_id': episodes_table.c.episode_id,
-        '_Episode_podcast': relationship(Podcast, back_populates='_Podcast_episodes'),
+        '_Episode_podcast': relationship(Podcast, back_populates='episodes'),
         '_episode_name': episodes_table.c.episode_name,
         '_episode_length': episodes_table.c.episode_length,
         '_episode_description': episodes_table.c.episode_description,
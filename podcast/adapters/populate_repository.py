@@ -1,35 +1,153 @@
 import os, csv
+import time
 
 import pytest
 from pathlib2 import Path
 
 from podcast.adapters.repository import AbstractRepository
-from podcast.adapters.datareader.csvdatareader import CSVDataReader
+from podcast.adapters.datareader.csvdatareader import CSVDataReader, CSVCatalog
+from podcast.adapters.orm import (authors_table, categories_table, episodes_table, podcast_categories_table,
+                                  podcast_table)
 
+# Rows sent to the database per executemany
+DEFAULT_BATCH_SIZE = 1000
 
-def populate_db(data_path: str, repo: AbstractRepository, testing: bool = False):
 
-    reader = CSVDataReader(data_path)
-    reader.create_podcast()
-    reader.load_episodes_into_podcasts()
+class LoadReport:
+    """Rows written per table by a bulk load, and how long it took."""
+
+    def __init__(self, rows: dict, seconds: float):
+        self.rows = rows
+        self.seconds = seconds
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total_rows / self.seconds if self.seconds else 0.0
+
+
+def populate_db(data_path: str, repo: AbstractRepository, testing: bool = False, catalog: CSVCatalog = None,
+                chunk_size: int = None, progress=None, batch_size: int = DEFAULT_BATCH_SIZE) -> LoadReport:
+    """Writes the catalog into the database with batched inserts in a single transaction.
+
+    progress, when given, is called after every batch with the table name, the rows written
+    to it so far and its rows per second."""
+
+    # With a chunk size the CSV files are streamed into the repo instead of being read up front
+    if chunk_size and catalog is None:
+        return stream_populate_db(data_path, repo, chunk_size, progress, batch_size)
 
-    authors = reader.author_dict.values()
-    podcasts = reader.podcast_list
-    categories = reader.category_dict.values()
-    episodes = reader.episode_list
+    # The catalog is read here unless one was already read by the caller
+    if catalog is None:
+        catalog = CSVDataReader(data_path).read_catalog()
 
-    if reader.podcast_list is None:
+    if catalog.podcasts is None:
         raise Exception("No podcasts found")
 
-    # Add authors to the repo
-    repo.add_multiple_authors(authors)
+    batches = catalog_batches(catalog.authors, catalog.categories, catalog.podcasts, catalog.episodes, batch_size)
+    return bulk_load(repo, batches, progress)
+
+
+def stream_populate_db(data_path: str, repo: AbstractRepository, chunk_size: int, progress=None,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> LoadReport:
+    """Parses, validates and writes the CSV files chunk_size rows at a time.
+
+    Peak memory is bounded by the chunk size plus the distinct authors and categories,
+    so catalogs larger than RAM can be loaded."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+
+    reader = CSVDataReader(data_path)
+
+    def batches():
+        for authors, categories, podcasts in reader.iter_podcast_chunks(chunk_size):
+            # Authors and categories first seen in this chunk are written before the podcasts using them
+            yield from catalog_batches(authors, categories, podcasts, [], batch_size)
+
+        for episodes in reader.iter_episode_chunks(chunk_size):
+            yield from catalog_batches([], [], [], episodes, batch_size)
+
+    return bulk_load(repo, batches(), progress)
+
+
+def bulk_load(repo: AbstractRepository, batches, progress=None) -> LoadReport:
+    started = time.perf_counter()
+    table_started = dict()
+    last_batch_done = started
+
+    def report_progress(table_name: str, rows: int):
+        nonlocal last_batch_done
+        now = time.perf_counter()
+        # A table's clock starts when the batch before its first one finished
+        table_started.setdefault(table_name, last_batch_done)
+        last_batch_done = now
+        if progress is not None:
+            elapsed = now - table_started[table_name]
+            progress(table_name, rows, rows / elapsed if elapsed else 0.0)
+
+    rows = repo.bulk_load(batches, report_progress)
+    report = LoadReport(rows, time.perf_counter() - started)
+
+    # Fill the full-text search table from the tables just written
+    repo.rebuild_search_index()
+    return report
+
+
+def catalog_batches(authors, categories, podcasts, episodes, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Yields (table, rows) batches of at most batch_size rows, parents before children."""
+    yield from table_batches(authors_table, (author_row(author) for author in authors), batch_size)
+    yield from table_batches(categories_table, (category_row(category) for category in categories), batch_size)
+    yield from table_batches(podcast_table, (podcast_row(podcast) for podcast in podcasts), batch_size)
+    yield from table_batches(podcast_categories_table,
+                             ({'podcast_id': podcast.id, 'category_id': category.id}
+                              for podcast in podcasts for category in podcast.categories), batch_size)
+    yield from table_batches(episodes_table, (episode_row(episode) for episode in episodes), batch_size)
+
+
+def table_batches(table, rows, batch_size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield table, batch
+            batch = []
+    if batch:
+        yield table, batch
+
+
+def author_row(author) -> dict:
+    return {'author_id': author.id, 'author_name': author.name}
+
+
+def category_row(category) -> dict:
+    return {'category_id': category.id, 'category_name': category.name}
 
-    # Add categories to the repo
-    repo.add_multiple_categories(categories)
 
-    # # Add podcasts to the repo
-    repo.add_multiple_podcasts(podcasts)
+def podcast_row(podcast) -> dict:
+    return {
+        'podcast_id': podcast.id,
+        'podcast_title': podcast.title,
+        'podcast_image_url': podcast.image,
+        'podcast_description': podcast.description,
+        'podcast_language': podcast.language,
+        'podcast_website_url': podcast.website,
+        'author_id': podcast.author.id if podcast.author is not None else None,
+        'podcast_itunes_id': podcast.itunes_id,
+        'comments': podcast.serialize_comments(),
+        'reviews': podcast.serialize_user_reviews(),
+    }
 
-    # Add episodes to the repo
-    repo.add_multiple_episodes(episodes)
 
+def episode_row(episode) -> dict:
+    return {
+        'episode_id': episode.episode_id,
+        'podcast_id': episode.podcast_id,
+        'episode_name': episode.episode_name,
+        'episode_length': episode.epi_length,
+        'episode_description': episode.episode_description,
+        'episode_date': episode.publication_date,
+        'episode_link': episode.link_to_audio,
+    }
@@ -1,6 +1,9 @@
+from __future__ import annotations
+
 import abc
 from typing import List, Iterable
-from podcast.domainmodel.model import Podcast, Author, Episode, Category, User
+from podcast.domainmodel.model import Podcast, Author, Episode, Category, User, rating_bucket
+from podcast.adapters.search import SUGGESTIONS
 
 repo_instance = None
 
@@ -10,6 +13,37 @@ class RepositoryException(Exception):
         print(f'RepositoryException: {message}')
 
 
+class Page:
+    """One page of podcasts, with the number of podcasts across all pages."""
+
+    def __init__(self, items: list, total: int):
+        self.items = items
+        self.total = total
+
+
+class RatingSummary:
+    """How many ratings a podcast has, their total and how many fell in each star bucket."""
+
+    def __init__(self, count: int = 0, total: float = 0.0, histogram: dict = None):
+        self.count = count
+        self.total = total
+        self.histogram = histogram if histogram is not None else {stars: 0 for stars in range(1, 6)}
+
+    @property
+    def average(self) -> float | None:
+        return round(self.total / self.count, 2) if self.count else None
+
+
+def podcast_sort_key(podcast: Podcast, sort: str = 'title') -> tuple:
+    """The key podcasts are ordered by for a sort. Ties on title are broken by id, so keys are
+    unique and can be used as paging cursors."""
+    if sort == 'title':
+        return podcast.title, podcast.id
+    if sort == 'id':
+        return podcast.id,
+    raise RepositoryException(f'Podcasts cannot be sorted by {sort}')
+
+
 class AbstractRepository(abc.ABC):
 
     @abc.abstractmethod
@@ -27,8 +61,67 @@ class AbstractRepository(abc.ABC):
         """ Returns the number of podcasts that exist in the repository"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_podcast_by_id(self, podcast_id: int):
+        """ Returns the podcast with the given id, or None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_podcast_by_title(self, podcast_title: str):
+        """ Returns the podcast with exactly the given title, or None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_podcast_details(self, podcast_title: str):
+        """ Returns the podcast with exactly the given title, with its author, categories and
+        episodes loaded, or None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_podcasts_by_category(self, category_id: int):
+        """ Returns the podcasts in the category with the given id"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_podcasts(self, query: str, filter_by: str = 'all'):
+        """ Returns the podcasts matching the query, best match first. filter_by is one of
+        'title', 'author', 'category' or 'all', or 'fuzzy' to match titles and authors allowing typos"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_rating_summary(self, podcast_id: int) -> RatingSummary:
+        """ Returns the count, average and star histogram of a podcast's ratings"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_podcasts_page(self, offset: int, limit: int, sort: str = 'title', after: tuple = None,
+                          before: tuple = None, last: bool = False) -> Page:
+        """ Returns limit podcasts ordered by 'title' or 'id'. They start at offset, or right after
+        or before the podcast with the podcast_sort_key after/before, or are the last limit podcasts"""
+        raise NotImplementedError
 
+    @abc.abstractmethod
+    def search_podcasts_page(self, query: str, filter_by: str, offset: int, limit: int) -> Page:
+        """ Returns one page of search_podcasts results and the number of matches"""
+        raise NotImplementedError
 
+    @abc.abstractmethod
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS) -> list:
+        """ Returns up to limit (kind, text) pairs of titles, authors and categories with a word
+        starting with prefix, for suggestions as a search is typed"""
+        raise NotImplementedError
 
+    @abc.abstractmethod
+    def add_subscription(self, user: User, podcast: Podcast) -> bool:
+        """ Subscribes the user to the podcast. Returns False if they already were subscribed"""
+        raise NotImplementedError
 
+    @abc.abstractmethod
+    def remove_subscription(self, user: User, podcast: Podcast) -> bool:
+        """ Unsubscribes the user from the podcast. Returns False if they were not subscribed"""
+        raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_subscriptions(self, user: User) -> list:
+        """ Returns the podcasts the user subscribes to, oldest subscription first"""
+        raise NotImplementedError
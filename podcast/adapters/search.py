@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+
+from podcast.domainmodel.model import Podcast
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Fields that are indexed, with how much a match in each one counts towards the score
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'author': 2.0,
+    'category': 2.0,
+    'description': 1.0,
+}
+
+# The searchbar filters map onto fields; 'all' searches every field
+SEARCH_FIELDS = {
+    'title': ('title',),
+    'author': ('author',),
+    'category': ('category',),
+    'all': tuple(FIELD_WEIGHTS),
+}
+
+# Typo tolerant search over titles and author names, offered next to the SEARCH_FIELDS filters
+FUZZY = 'fuzzy'
+FUZZY_FIELDS = ('title', 'author')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Suggestions returned for a prefix unless asked for fewer, and at most
+SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+# Suggestions for prefixes up to this long are ranked when the index is built, since they match
+# a large share of the names
+SHORT_PREFIX = 3
+
+
+def tokenize(text) -> list[str]:
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+def normalize_query(query: str) -> str:
+    """The terms of a query, casefolded and single spaced. A query wrapped in double quotes, which
+    is searched as a phrase, keeps its quotes."""
+    terms = ' '.join(tokenize(query))
+    stripped = query.strip() if query else ''
+    if len(stripped) > 1 and stripped.startswith('"') and stripped.endswith('"'):
+        return f'"{terms}"'
+    return terms
+
+
+def podcast_fields(podcast: Podcast) -> dict:
+    author = podcast.author
+    return {
+        'title': podcast.title,
+        'author': author.name if author is not None else '',
+        'category': ' '.join(category.name for category in podcast.categories),
+        'description': podcast.description,
+    }
+
+
+class SearchIndex:
+    """Tokenized inverted index over podcast title, author, category and description.
+
+    Each field keeps postings of term -> {podcast id: term frequency}, so a query only
+    visits the podcasts that contain its terms. Results are ranked with BM25, summed over
+    the searched fields using FIELD_WEIGHTS."""
+
+    def __init__(self):
+        self.__postings = {field: dict() for field in FIELD_WEIGHTS}
+        self.__lengths = {field: dict() for field in FIELD_WEIGHTS}
+        self.__total_lengths = {field: 0 for field in FIELD_WEIGHTS}
+        self.__terms = {field: None for field in FIELD_WEIGHTS}
+
+    def __len__(self):
+        return len(self.__lengths['title'])
+
+    def __contains__(self, podcast_id):
+        return podcast_id in self.__lengths['title']
+
+    def add(self, podcast_id: int, fields: dict):
+        if podcast_id in self:
+            self.remove(podcast_id)
+        for field in FIELD_WEIGHTS:
+            tokens = tokenize(fields.get(field))
+            postings = self.__postings[field]
+            for term, frequency in Counter(tokens).items():
+                if term not in postings:
+                    postings[term] = dict()
+                    # The sorted term list used for prefixes is rebuilt on the next query
+                    self.__terms[field] = None
+                postings[term][podcast_id] = frequency
+            self.__lengths[field][podcast_id] = len(tokens)
+            self.__total_lengths[field] += len(tokens)
+
+    def add_podcast(self, podcast: Podcast):
+        self.add(podcast.id, podcast_fields(podcast))
+
+    def remove(self, podcast_id: int):
+        for field in FIELD_WEIGHTS:
+            length = self.__lengths[field].pop(podcast_id, None)
+            if length is None:
+                continue
+            self.__total_lengths[field] -= length
+            postings = self.__postings[field]
+            for term in [term for term, documents in postings.items() if podcast_id in documents]:
+                del postings[term][podcast_id]
+                if not postings[term]:
+                    del postings[term]
+                    self.__terms[field] = None
+
+    def sort_terms(self):
+        """Builds the sorted term lists used for prefix matching ahead of the first query."""
+        for field, postings in self.__postings.items():
+            if self.__terms[field] is None:
+                self.__terms[field] = sorted(postings)
+
+    def expand(self, field: str, term: str, prefix: bool) -> list[str]:
+        """Returns the indexed terms of a field that a query term matches. A prefix is expanded
+        to every term starting with it, so no matching podcast is left out of the results."""
+        postings = self.__postings[field]
+        if not prefix:
+            return [term] if term in postings else []
+        terms = self.__terms[field]
+        if terms is None:
+            terms = self.__terms[field] = sorted(postings)
+        # Terms starting with the prefix sort between it and the prefix followed by the last code point
+        return terms[bisect_left(terms, term):bisect_left(terms, term + '\U0010ffff')]
+
+    def search(self, query: str, filter_by: str = 'all', prefix: bool = True) -> list[int]:
+        """Returns the ids of the podcasts matching every query term, best match first.
+
+        With prefix set, the last query term also matches longer terms, so partly typed
+        words still find results."""
+        query_terms = tokenize(query)
+        fields = SEARCH_FIELDS.get(filter_by, SEARCH_FIELDS['all'])
+        if not query_terms:
+            return []
+
+        scores = None
+        for position, query_term in enumerate(query_terms):
+            is_prefix = prefix and position == len(query_terms) - 1
+            term_scores = dict()
+            for field in fields:
+                for term in self.expand(field, query_term, is_prefix):
+                    self.score_term(field, term, term_scores)
+            if scores is None:
+                scores = term_scores
+            else:
+                # Every query term has to match somewhere in the searched fields
+                scores = {podcast_id: score + term_scores[podcast_id]
+                          for podcast_id, score in scores.items() if podcast_id in term_scores}
+            if not scores:
+                return []
+
+        return [podcast_id for podcast_id, score in
+                sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+    def score_term(self, field: str, term: str, scores: dict):
+        documents = self.__postings[field][term]
+        lengths = self.__lengths[field]
+        count = len(lengths)
+        average_length = self.__total_lengths[field] / count if count else 0
+        idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+        weight = FIELD_WEIGHTS[field]
+        for podcast_id, frequency in documents.items():
+            length_norm = 1 - B + B * (lengths[podcast_id] / average_length if average_length else 0)
+            score = weight * idf * frequency * (K1 + 1) / (frequency + K1 * length_norm)
+            scores[podcast_id] = scores.get(podcast_id, 0) + score
+
+
+def suggestion_entries(podcasts) -> list[tuple[str, str, int]]:
+    """(kind, text, weight) entries for a SuggestionIndex: every title, and every author and
+    category weighted by how many podcasts it has."""
+    entries = []
+    authors = Counter()
+    categories = Counter()
+    for podcast in podcasts:
+        entries.append(('title', podcast.title, 1))
+        if podcast.author is not None:
+            authors[podcast.author.name] += 1
+        for category in podcast.categories:
+            categories[category.name] += 1
+    entries.extend(('author', name, count) for name, count in authors.items())
+    entries.extend(('category', name, count) for name, count in categories.items())
+    return entries
+
+
+class SuggestionIndex:
+    """Sorted array of title, author and category names, for suggestions as a query is typed.
+
+    Each name is stored under its normalized text and under every later word, so 'radio' also
+    suggests 'Brian Denny Radio'. A prefix is found by bisecting the keys. Names that start with
+    the prefix come first, then the ones with more podcasts. The best names for every prefix of
+    up to SHORT_PREFIX characters are kept ready, so the first keystrokes only cost a lookup."""
+
+    def __init__(self, entries):
+        self.__entries = []
+        keyed = []
+        for kind, text, weight in entries:
+            terms = tokenize(text)
+            if not terms:
+                continue
+            entry_id = len(self.__entries)
+            self.__entries.append((kind, text, weight))
+            for position in range(len(terms)):
+                keyed.append((' '.join(terms[position:]), position > 0, entry_id))
+        keyed.sort()
+        self.__keys = [key for key, _, _ in keyed]
+        self.__matches = [(later_word, entry_id) for _, later_word, entry_id in keyed]
+
+        # Keys sharing a short prefix are next to each other, so each prefix is one range
+        self.__short = dict()
+        for length in range(1, SHORT_PREFIX + 1):
+            start = 0
+            while start < len(self.__keys):
+                prefix = self.__keys[start][:length]
+                if len(prefix) < length:
+                    # Shorter keys are only matched by shorter prefixes
+                    start += 1
+                    continue
+                end = bisect_left(self.__keys, prefix + '\U0010ffff', start)
+                self.__short[prefix] = self.__best(start, end, MAX_SUGGESTIONS)
+                start = end
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS) -> list[tuple[str, str]]:
+        """Returns up to limit (kind, text) pairs whose text has a word starting with prefix."""
+        terms = tokenize(prefix)
+        if not terms or limit < 1:
+            return []
+        key = ' '.join(terms)
+        # A trailing space means the last word is complete
+        if prefix[-1].isspace():
+            key += ' '
+        if len(key) <= SHORT_PREFIX:
+            return self.__short.get(key, [])[:limit]
+        start = bisect_left(self.__keys, key)
+        end = bisect_left(self.__keys, key + '\U0010ffff', start)
+        return self.__best(start, end, min(limit, MAX_SUGGESTIONS))
+
+    def __best(self, start: int, end: int, limit: int) -> list[tuple[str, str]]:
+        # The best rank of each name, as it can match at more than one word
+        ranks = dict()
+        for later_word, entry_id in self.__matches[start:end]:
+            kind, text, weight = self.__entries[entry_id]
+            rank = (later_word, -weight, text.casefold(), kind)
+            if entry_id not in ranks or rank < ranks[entry_id]:
+                ranks[entry_id] = rank
+        best = heapq.nsmallest(limit, ranks.items(), key=lambda item: item[1])
+        return [self.__entries[entry_id][:2] for entry_id, _ in best]
+
+
+def trigrams(term: str) -> set[str]:
+    # The term is padded, so its first and last letters appear in as many trigrams as the others
+    padded = f'$${term}$'
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+def allowed_edits(term: str) -> int:
+    """How many typos a query term may contain: none in very short terms, two in long ones."""
+    if len(term) <= 2:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def edit_distance(source: str, target: str, limit: int) -> int:
+    """Optimal string alignment distance: insertions, deletions, substitutions and swaps of
+    adjacent letters each count as one edit. Stops early and returns limit + 1 once the
+    distance is known to be over limit."""
+    if abs(len(source) - len(target)) > limit:
+        return limit + 1
+    previous_row = None
+    row = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        earlier_row, previous_row = previous_row, row
+        row = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]:
+                row[j] = min(row[j], earlier_row[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return min(row[-1], limit + 1)
+
+
+class FuzzyIndex:
+    """Trigram index over the words of podcast titles and author names, for typo tolerant search.
+
+    A query word is looked up by its trigrams among the indexed words of about its length, so
+    only words sharing enough trigrams with it become candidates, and those are re-ranked by
+    edit distance. The cost grows with the number of candidates, not with the size of the
+    catalog."""
+
+    def __init__(self):
+        self.__term_ids = dict()
+        self.__terms = []
+        # (word length, trigram) -> ids of the words of that length containing it
+        self.__trigrams = dict()
+        # word id -> {podcast id: weight of the best field the word is in}
+        self.__postings = []
+        self.__podcast_terms = dict()
+
+    def __len__(self):
+        return len(self.__podcast_terms)
+
+    def __term_id(self, term: str) -> int:
+        term_id = self.__term_ids.get(term)
+        if term_id is None:
+            term_id = self.__term_ids[term] = len(self.__terms)
+            self.__terms.append(term)
+            self.__postings.append(dict())
+            for trigram in trigrams(term):
+                self.__trigrams.setdefault((len(term), trigram), []).append(term_id)
+        return term_id
+
+    def add(self, podcast_id: int, fields: dict):
+        if podcast_id in self.__podcast_terms:
+            self.remove(podcast_id)
+        term_ids = set()
+        for field in FUZZY_FIELDS:
+            for term in tokenize(fields.get(field)):
+                term_id = self.__term_id(term)
+                postings = self.__postings[term_id]
+                postings[podcast_id] = max(postings.get(podcast_id, 0), FIELD_WEIGHTS[field])
+                term_ids.add(term_id)
+        self.__podcast_terms[podcast_id] = term_ids
+
+    def add_podcast(self, podcast: Podcast):
+        self.add(podcast.id, podcast_fields(podcast))
+
+    def remove(self, podcast_id: int):
+        # Words stay in the vocabulary; without postings they match nothing
+        for term_id in self.__podcast_terms.pop(podcast_id, ()):
+            self.__postings[term_id].pop(podcast_id, None)
+
+    def candidate_terms(self, term: str, edits: int) -> set[int]:
+        """Returns the ids of the indexed words that may be within edits of a query word, the
+        only ones whose edit distance is computed."""
+        if edits == 0:
+            term_id = self.__term_ids.get(term)
+            return set() if term_id is None else {term_id}
+
+        term_trigrams = trigrams(term)
+        # Words more than edits longer or shorter are never close enough, so they are not counted
+        shared = Counter()
+        for length in range(len(term) - edits, len(term) + edits + 1):
+            for trigram in term_trigrams:
+                shared.update(self.__trigrams.get((length, trigram), ()))
+        # An insertion, deletion or substitution changes at most three trigrams, so a word within
+        # edits of those shares all the others. Only very short words could share none.
+        required = max(len(term_trigrams) - 3 * edits, 1)
+        matches = {term_id for term_id, count in shared.items() if count >= required}
+
+        # Swapping two adjacent letters is one edit but can change four trigrams. Words reached
+        # through a swap are found by undoing it and looking for the remaining edits.
+        for position in range(len(term) - 1):
+            if term[position] != term[position + 1]:
+                swapped = term[:position] + term[position + 1] + term[position] + term[position + 2:]
+                matches |= self.candidate_terms(swapped, edits - 1)
+        return matches
+
+    def candidates(self, term: str) -> list[tuple[int, int]]:
+        """Returns (word id, edit distance) of the indexed words a query word may be a typo of."""
+        edits = allowed_edits(term)
+        matches = []
+        for term_id in self.candidate_terms(term, edits):
+            distance = edit_distance(term, self.__terms[term_id], edits)
+            if distance <= edits:
+                matches.append((term_id, distance))
+        return matches
+
+    def search(self, query: str) -> list[int]:
+        """Returns the ids of the podcasts with a title or author word close to every query word,
+        fewest typos first, then title matches before author matches."""
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+
+        ranks = None
+        for query_term in query_terms:
+            # podcast id -> (edits, -weight) of the closest word matching this query word
+            term_ranks = dict()
+            for term_id, distance in self.candidates(query_term):
+                for podcast_id, weight in self.__postings[term_id].items():
+                    rank = (distance, -weight)
+                    if podcast_id not in term_ranks or rank < term_ranks[podcast_id]:
+                        term_ranks[podcast_id] = rank
+            if ranks is None:
+                ranks = term_ranks
+            else:
+                ranks = {podcast_id: (rank[0] + term_ranks[podcast_id][0], rank[1] + term_ranks[podcast_id][1])
+                         for podcast_id, rank in ranks.items() if podcast_id in term_ranks}
+            if not ranks:
+                return []
+
+        return [podcast_id for podcast_id, rank in sorted(ranks.items(), key=lambda item: (item[1], item[0]))]
@@ -4,7 +4,6 @@ from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, session
 
 import podcast.adapters.repository as repo
-from podcast.adapters.memory_repository import make_podcast_list_into_dict
 from podcast.authentication.authentication import login_required
 from podcast.playlist.playlist import get_user_obj
 import podcast.description.services as services
@@ -13,18 +12,16 @@ from podcast.adapters.database_repository import SqlAlchemyRepository
 description_blueprint = Blueprint(
     'description_bp', __name__)
 
+# Newest comments shown on a podcast's page in Database mode
+COMMENTS_SHOWN = 50
+
 
 @description_blueprint.route('/podcast_description/<podcast_title>', methods=['GET', 'POST'])
 def description(podcast_title):
 
     if os.environ.get('REPOSITORY') == 'Database':
-        podcast_list = services.get_podcasts(repo.repo_instance)
-        podcast_dict = services.make_podcast_list_into_dict(podcast_list)
-
-        podcast_id = services.get_podcast_id_by_title(podcast_title, repo.repo_instance)
-        selected_podcast = None
-        if podcast_title in podcast_dict:
-            selected_podcast = podcast_dict[podcast_title]
+        # Only this podcast is loaded, with everything the page shows
+        selected_podcast = services.get_podcast_details(podcast_title, repo.repo_instance)
 
         if request.method == 'POST':
             if 'user_name' in session:
@@ -49,17 +46,15 @@ def description(podcast_title):
             else:
                 return redirect(url_for('authentication_bp.login'))
 
-        reviews_list = services.get_reviews_by_podcast_id(podcast_id, repo.repo_instance)
+        # The rating is aggregated by the database and only the newest comments are read,
+        # so podcasts with many reviews cost the same to show
         comments_list = []
-        average_user_rating = 0
-        for review in reviews_list:
-            comments_list.append(review._review_content)
-            average_user_rating += review._user_rating
-
-        if len(reviews_list) == 0:
-            average_user_rating = None
-        else:
-            average_user_rating = float(average_user_rating / len(reviews_list))
+        average_user_rating = None
+        if selected_podcast is not None:
+            reviews_list = services.get_reviews_by_podcast_id(selected_podcast.id, repo.repo_instance,
+                                                              COMMENTS_SHOWN)
+            comments_list = [review.review_content for review in reviews_list]
+            average_user_rating = services.get_rating_summary(selected_podcast.id, repo.repo_instance).average
 
         return render_template(
             'description/description.html',
@@ -69,18 +64,15 @@ def description(podcast_title):
         )
 
     else:
-        podcast_list = repo.repo_instance.get_podcasts()
-        podcast_dict = make_podcast_list_into_dict(podcast_list)
+        selected_podcast = services.get_podcast(podcast_title, repo.repo_instance)
 
         if request.method == 'POST':
             if 'user_name' in session:
-                make_comment(podcast_title, podcast_dict)
+                make_comment(podcast_title, selected_podcast)
             else:
                 return redirect(url_for('authentication_bp.login'))
 
-        if podcast_title in podcast_dict:
-            selected_podcast = podcast_dict[podcast_title]
-        else:
+        if selected_podcast is None:
             user_name = session.get('user_name')
             if user_name:
                 user = get_user_obj(user_name, repo.repo_instance)
@@ -104,7 +96,7 @@ def description(podcast_title):
 
 
 #@login_required
-def make_comment(podcast_title, podcast_dict):
+def make_comment(podcast_title, podcast):
 
     if os.environ.get('REPOSITORY') == 'Database':
         pass
@@ -114,20 +106,19 @@ def make_comment(podcast_title, podcast_dict):
         comment = request.form.get('comment')
         individual_user_review = request.form.get('user_review')
 
-        add_user_reviews(podcast_title, podcast_dict)
+        add_user_reviews(podcast_title, podcast)
         parsed_comment = (str(session['user_name']).capitalize() +
                     f''' commented "{comment}" and rated this {individual_user_review}/5. {str(datetime.now().date())}''')
         if comment.strip() == "":
             parsed_comment = str(session['user_name']).capitalize() + f" rated this {individual_user_review}/5. {str(datetime.now().date())}"
-        podcast_dict[podcast_title].get_comments.append(parsed_comment)
+        podcast.get_comments.append(parsed_comment)
         return redirect(url_for('description_bp.description', podcast_title=podcast_title))
 
 
 #@login_required
-def add_user_reviews(podcast_title, podcast_dict):
+def add_user_reviews(podcast_title, podcast):
     user_review = float(request.form.get('user_review'))
-    review = podcast_dict[podcast_title].get_average_rating()
-    podcast_dict[podcast_title].user_reviews.append(user_review)
-    podcast_dict[podcast_title].set_average_rating(review)
+    podcast.add_user_review(user_review)
+    podcast.set_average_rating(podcast.get_average_rating())
 
     return redirect(url_for('description_bp.description', podcast_title=podcast_title))
@@ -26,9 +26,10 @@ def make_podcast_list_into_dict(podcast_list: list) -> dict:
     return podcast_dictionary
 
 def get_podcast(podcast_title: str, repo: AbstractRepository):
-    for podcast in repo.get_podcasts():
-        if podcast.title == podcast_title:
-            return podcast
+    return repo.get_podcast_by_title(podcast_title)
+
+def get_podcast_details(podcast_title: str, repo: AbstractRepository):
+    return repo.get_podcast_details(podcast_title)
 
 
 def add_review(podcast: Podcast, user: User, rating: float, comment: str, repo: AbstractRepository):
@@ -37,8 +38,12 @@ def add_review(podcast: Podcast, user: User, rating: float, comment: str, repo:
     repo.add_review(review)
 
 
-def get_reviews_by_podcast_id(podcast_id: str, repo: AbstractRepository):
-    return repo.get_reviews_by_podcast_id(podcast_id)
+def get_reviews_by_podcast_id(podcast_id: str, repo: AbstractRepository, limit: int = None):
+    return repo.get_reviews_by_podcast_id(podcast_id, limit)
+
+
+def get_rating_summary(podcast_id: int, repo: AbstractRepository):
+    return repo.get_rating_summary(podcast_id)
 
 
 def get_podcast_id_by_title(podcast_title: str, repo: AbstractRepository):
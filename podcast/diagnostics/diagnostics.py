@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+
+import podcast.adapters.repository as repo
+import podcast.diagnostics.services as services
+
+diagnostics_blueprint = Blueprint(
+    'diagnostics_bp', __name__, url_prefix='/diagnostics')
+
+
+@diagnostics_blueprint.route('/memory', methods=['GET'])
+def memory():
+    # Each worker answers for itself, so repeated requests show the spread across workers
+    return jsonify(services.get_memory_usage())
+
+
+@diagnostics_blueprint.route('/cache', methods=['GET'])
+def cache():
+    return jsonify(services.get_cache_stats(repo.repo_instance))
@@ -0,0 +1,43 @@
+import os
+
+
+def read_smaps_rollup(pathway: str = '/proc/self/smaps_rollup') -> dict[str, int]:
+    """Returns the kB totals from a Linux smaps_rollup file, keyed by field name."""
+    totals = dict()
+    with open(pathway) as smaps_file:
+        for line in smaps_file:
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == 'kB':
+                totals[fields[0].rstrip(':')] = int(fields[1])
+    return totals
+
+
+def get_memory_usage() -> dict:
+    """Resident memory of this worker, split into pages shared with other processes (e.g. the
+    preloading master) and pages unique to this worker."""
+    usage = {'pid': os.getpid()}
+    try:
+        totals = read_smaps_rollup()
+    except OSError:
+        # Not Linux: only the peak resident size is available, and not at all on Windows
+        try:
+            import resource
+        except ImportError:
+            return usage
+        usage['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage
+
+    usage['rss_kb'] = totals.get('Rss', 0)
+    usage['pss_kb'] = totals.get('Pss', 0)
+    usage['shared_kb'] = totals.get('Shared_Clean', 0) + totals.get('Shared_Dirty', 0)
+    usage['unique_kb'] = totals.get('Private_Clean', 0) + totals.get('Private_Dirty', 0)
+    return usage
+
+
+def get_cache_stats(repo) -> dict:
+    """Hit, miss and eviction counts of the repository's query and search caches in this worker."""
+    stats = {'pid': os.getpid()}
+    for name in ('query_cache', 'search_cache'):
+        cache = getattr(repo, name, None)
+        stats[name] = {'enabled': False} if cache is None else {'enabled': True, **cache.stats()}
+    return stats
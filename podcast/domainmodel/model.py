@@ -16,6 +16,11 @@ def validate_non_empty_string(value, field_name="value"):
         raise ValueError(f"{field_name} must be a non-empty string.")
 
 
+def rating_bucket(rating: float) -> int:
+    """The whole-star histogram bucket, 1 to 5, a rating is counted in."""
+    return min(max(int(rating), 1), 5)
+
+
 class Author:
     def __init__(self, author_id: int, name: str):
         validate_non_negative_int(author_id)
@@ -64,6 +69,13 @@ class Author:
         return hash(self.id)
 
 class Podcast:
+    # Running rating aggregates, kept up to date by add_user_review and remove_user_review.
+    # Podcasts loaded by the ORM skip __init__, so None means they have not been counted yet.
+    _rating_count: int = None
+    _rating_sum: float = 0.0
+    _rating_sum_of_squares: float = 0.0
+    _rating_histogram: list = None
+
     def __init__(self, podcast_id: int, author: Author, title: str = "Untitled", image: str = None,
                  description: str = "", website: str = "", itunes_id: int = None, language: str = "Unspecified"):
         # validate_non_negative_int(podcast_id)
@@ -81,6 +93,7 @@ class Podcast:
         self._comment_section = []
         self._user_reviews: list[float] = list()
         self._average_review: float = -1.0
+        self._count_ratings()
 
     @property
     def id(self) -> int:
@@ -108,6 +121,7 @@ class Podcast:
     @user_reviews.setter
     def user_reviews(self, reviews: list):
         self._user_reviews = reviews
+        self._count_ratings()
 
     def serialize_user_reviews(self):
         return json.dumps(self._user_reviews)
@@ -117,15 +131,66 @@ class Podcast:
             return json.loads(self._user_reviews)
 
     def add_user_review(self, user_review: float):
+        self._ensure_rating_counts()
         self._user_reviews.append(user_review)
+        self._tally_rating(user_review, 1)
 
     def remove_user_review(self, user_review: float):
+        self._ensure_rating_counts()
         self._user_reviews.remove(user_review)
+        self._tally_rating(user_review, -1)
+
+    def _count_ratings(self):
+        reviews = self._user_reviews
+        if isinstance(reviews, str):
+            reviews = json.loads(reviews)
+        self._rating_count = 0
+        self._rating_sum = 0.0
+        self._rating_sum_of_squares = 0.0
+        self._rating_histogram = [0] * 5
+        for rating in reviews or []:
+            self._tally_rating(rating, 1)
+
+    def _ensure_rating_counts(self):
+        if self._rating_count is None:
+            self._count_ratings()
+
+    def _tally_rating(self, rating: float, direction: int):
+        self._rating_count += direction
+        self._rating_sum += direction * rating
+        self._rating_sum_of_squares += direction * rating * rating
+        self._rating_histogram[rating_bucket(rating) - 1] += direction
+
+    @property
+    def rating_count(self) -> int:
+        self._ensure_rating_counts()
+        return self._rating_count
+
+    @property
+    def rating_sum(self) -> float:
+        self._ensure_rating_counts()
+        return self._rating_sum
+
+    @property
+    def rating_histogram(self) -> dict:
+        """How many ratings fell in each whole-star bucket, 1 to 5."""
+        self._ensure_rating_counts()
+        return {stars: count for stars, count in enumerate(self._rating_histogram, start=1)}
+
+    @property
+    def rating_variance(self) -> float | None:
+        """Population variance of the ratings, or None when there are none."""
+        self._ensure_rating_counts()
+        if not self._rating_count:
+            return None
+        mean = self._rating_sum / self._rating_count
+        # Rounding can leave a tiny negative value when every rating is the same
+        return max(self._rating_sum_of_squares / self._rating_count - mean * mean, 0.0)
 
     def get_average_rating(self) -> float | str:
-        this_comment_section = self.serialize_comments()
-        if len(this_comment_section) != 0:
-            return round(sum(self._user_reviews) / (len(this_comment_section)), 2)
+        self._ensure_rating_counts()
+        if self._rating_count:
+            return round(self._rating_sum / self._rating_count, 2)
         else:
             return "Podcast has no ratings yet."
 
@@ -221,15 +286,22 @@ class Podcast:
         if category in self.categories:
             self.categories.remove(category)
 
+    def _writable_episodes(self) -> list:
+        # Episodes held in an episode store or frozen into a tuple are read-only sequences.
+        # They are copied into a list the first time this podcast's episodes change.
+        if not isinstance(self.episodes, list):
+            self.episodes = list(self.episodes)
+        return self.episodes
+
     def add_episode(self, episode: Episode):
         if not isinstance(episode, Episode):
             raise TypeError("Expected an Episode instance.")
         if episode not in self.episodes:
-            self.episodes.append(episode)
+            self._writable_episodes().append(episode)
 
     def remove_episode(self, episode: Episode):
         if episode in self.episodes:
-            self.episodes.remove(episode)
+            self._writable_episodes().remove(episode)
 
     def to_dict(self):
         return {
@@ -308,6 +380,9 @@ class Category:
         return hash(self._id)
 
 class User:
+    # Users loaded by the ORM skip __init__; their list is started on first use
+    _subscription_list: list = None
+
     def __init__(self, user_id: int, username: str, password: str):
         # validate_non_negative_int(user_id)
         validate_non_empty_string(username, "Username")
@@ -315,11 +390,15 @@ class User:
         self._id = user_id
         self._username = username.lower().strip()
         self._password = password
-        self._subscription_list = [Podcast(99999, self.username, "Favorited Episodes",
-                                           "https://previews.123rf.com/images/lkeskinen/lkeskinen1709/lkeskinen170906691/85997053-favorite-word-in-a-black-and-white-design-rubber-stamp-isolated-on-white.jpg",
-                                           "This is where all your favorite episodes are stored.")]
+        self._subscription_list = self._new_subscription_list()
         self._reviews: List[Review] = list()
 
+    def _new_subscription_list(self) -> list:
+        # The first entry is always the user's favorited episodes
+        return [Podcast(99999, self.username, "Favorited Episodes",
+                        "https://previews.123rf.com/images/lkeskinen/lkeskinen1709/lkeskinen170906691/85997053-favorite-word-in-a-black-and-white-design-rubber-stamp-isolated-on-white.jpg",
+                        "This is where all your favorite episodes are stored.")]
+
     @property
     def id(self) -> int:
         return self._id
@@ -341,6 +420,8 @@ class User:
 
     @property
     def subscription_list(self):
+        if self._subscription_list is None:
+            self._subscription_list = self._new_subscription_list()
         return self._subscription_list
 
     @subscription_list.setter
@@ -20,22 +20,24 @@ def library():
     else:
         User_playlist = list()
 
-    podcasts = services.get_podcasts(repo.repo_instance)
-    podcast_length = services.get_number_of_podcasts(repo.repo_instance)
-
-    page = request.args.get('page', 1, type=int)
+    # Page links carry a cursor; a plain page number still works for old links
+    cursor = services.decode_cursor(request.args.get('cursor'))
+    page = cursor.get('page') if isinstance(cursor.get('page'), int) else request.args.get('page', 1, type=int)
+    page = max(page, 1)
     per_page = 30
-    start = (page - 1) * per_page
-    end = start + per_page
-    total_pages = (podcast_length + per_page - 1) // per_page
 
-    podcasts_on_page = podcasts[start:end]
+    # The repository only loads the podcasts on this page
+    podcast_page = services.get_podcasts_page(page, per_page, repo.repo_instance, cursor)
+    total_pages = (podcast_page.total + per_page - 1) // per_page
 
+    podcasts_on_page = podcast_page.items
+    cursors = services.get_page_cursors(podcasts_on_page, page, per_page, podcast_page.total)
 
     return render_template(
         'library/library.html',
         podcasts_on_page=podcasts_on_page,
         total_pages=total_pages,
         page=page,
+        cursors=cursors,
         User_playlist=User_playlist,
         )
\ No newline at end of file
@@ -1,4 +1,8 @@
-from podcast.adapters.repository import AbstractRepository
+import base64
+import binascii
+import json
+
+from podcast.adapters.repository import AbstractRepository, podcast_sort_key
 from podcast.domainmodel.model import Podcast
 
 class NonExistentPodcastException(Exception):
@@ -22,4 +26,61 @@ def get_podcasts(repo: AbstractRepository):
 def get_number_of_podcasts(repo: AbstractRepository):
     return repo.get_number_of_podcasts()
 
+def encode_cursor(cursor: dict) -> str:
+    data = json.dumps(cursor, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def is_sort_key(value) -> bool:
+    # A title cursor holds the (title, id) podcast_sort_key of a podcast
+    return (isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+            and isinstance(value[1], int) and not isinstance(value[1], bool))
+
+def is_count(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_valid_cursor(cursor) -> bool:
+    if not isinstance(cursor, dict) or not set(cursor) <= {'after', 'before', 'last', 'page'}:
+        return False
+    if 'page' in cursor and not is_count(cursor['page']):
+        return False
+    # A cursor points to at most one place: right after or before a podcast, or the last page
+    positions = [key for key in ('after', 'before', 'last') if key in cursor]
+    if len(positions) > 1:
+        return False
+    if positions == ['last']:
+        return is_count(cursor['last'])
+    return not positions or is_sort_key(cursor[positions[0]])
+
+def decode_cursor(token: str) -> dict:
+    # A cursor that cannot be read, or was not made by get_page_cursors, sends the user back to the first page
+    if not token:
+        return dict()
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return dict()
+    return cursor if is_valid_cursor(cursor) else dict()
+
+def get_podcasts_page(page: int, per_page: int, repo: AbstractRepository, cursor: dict = None):
+    # Cursors hold the sort key of the podcast next to the page, so no page walks the ones before it
+    cursor = cursor or dict()
+    if 'after' in cursor:
+        return repo.get_podcasts_page(0, per_page, after=tuple(cursor['after']))
+    if 'before' in cursor:
+        return repo.get_podcasts_page(0, per_page, before=tuple(cursor['before']))
+    if 'last' in cursor:
+        return repo.get_podcasts_page(0, min(max(cursor['last'], 1), per_page), last=True)
+    return repo.get_podcasts_page((page - 1) * per_page, per_page)
 
+def get_page_cursors(podcasts_on_page: list, page: int, per_page: int, total: int) -> dict:
+    """Cursor tokens for the previous, next and last page links. Each also holds the page
+    number shown in the page header."""
+    total_pages = (total + per_page - 1) // per_page
+    cursors = dict()
+    if podcasts_on_page and page > 1:
+        cursors['previous'] = encode_cursor({'before': podcast_sort_key(podcasts_on_page[0]), 'page': page - 1})
+    if podcasts_on_page and page < total_pages:
+        cursors['next'] = encode_cursor({'after': podcast_sort_key(podcasts_on_page[-1]), 'page': page + 1})
+    if total_pages > 1:
+        cursors['last'] = encode_cursor({'last': total - (total_pages - 1) * per_page, 'page': total_pages})
+    return cursors
@@ -4,7 +4,6 @@ from typing import Optional
 from flask import Blueprint, render_template, request, redirect, url_for, session
 
 from podcast.domainmodel.model import User
-from podcast.adapters.memory_repository import  make_podcast_list_into_dict
 import podcast.adapters.repository as repo
 from podcast.authentication.services import get_user_obj
 from podcast.adapters.database_repository import SqlAlchemyRepository
@@ -17,9 +16,6 @@ playlist_blueprint = Blueprint('playlist_bp', __name__)
 @playlist_blueprint.route('/playlist/<podcast_title>', methods=['GET', 'POST'])
 def playlist(podcast_title):
 
-    podcast_list = repo.repo_instance.get_podcasts()
-
-
     if os.environ.get('REPOSITORY') == 'Database':
         if request.method == "GET":
             episode_id = request.form.get('episode_id')
@@ -30,30 +26,23 @@ def playlist(podcast_title):
             return redirect(url_for('authentication_bp.login'))
 
         user = repo.repo_instance.get_user(user_name)
-        user_playlist = user.deserialize_subscription_list
-
-        # Check if the podcast is already in the user's subscription list
-        titles = [podcast.title for podcast in user_playlist]
-        if podcast_title not in titles:
-
-            # Assuming you have a method to fetch a podcast instance by title
-            podcast_instance = repo.repo_instance.get_podcast_by_title_from_db(podcast_title)
 
-            if podcast_instance is not None:
-                repo.repo_instance.add_podcast_to_user_subscription(user.id, podcast_instance)
+        # Subscribing inserts one row; the page then reads the subscriptions back with one join
+        podcast_instance = repo.repo_instance.get_podcast_by_title(podcast_title)
+        if podcast_instance is not None:
+            repo.repo_instance.add_subscription(user, podcast_instance)
 
-                # Redirect or render a template as needed
+        # The favorited episodes stay first, as in the memory repository
+        user_playlist = user.subscription_list[:1] + repo.repo_instance.get_subscriptions(user)
         return render_template("playlist/Playlists.html", User_playlist=user_playlist)
 
 
 
     else:
-        podcast_dict = make_podcast_list_into_dict(podcast_list)
-
         if request.method == "POST":
             episode_id = request.form.get('episode_id')
             podcast_title_for_epi = request.form.get('podcast_title')
-            episode = podcast_dict[podcast_title_for_epi].get_episode_with_id(episode_id)
+            episode = repo.repo_instance.get_podcast_by_title(podcast_title_for_epi).get_episode_with_id(episode_id)
 
             user_name = session.get('user_name')
             if user_name:
@@ -68,8 +57,9 @@ def playlist(podcast_title):
             user = get_user_obj(user_name, repo.repo_instance)
             user_playlist = user.subscription_list
 
-            if podcast_title in podcast_dict and podcast_dict[podcast_title] not in user_playlist:
-                user.subscription_list.append(podcast_dict[podcast_title])
+            selected_podcast = repo.repo_instance.get_podcast_by_title(podcast_title)
+            if selected_podcast is not None:
+                repo.repo_instance.add_subscription(user, selected_podcast)
 
         else:
             return redirect(url_for('authentication_bp.login'))
@@ -125,15 +115,12 @@ def remove_playlist(podcast_title):
     user_name = session.get('user_name')
     if user_name:
         user = get_user_obj(user_name, repo.repo_instance)
-        User_playlist = user.subscription_list
     else:
         return redirect(url_for('authentication_bp.login'))
 
-
-    for index, podcast in enumerate(User_playlist):
-        if podcast.title == podcast_title:
-            User_playlist.pop(index)
-            break
+    podcast = repo.repo_instance.get_podcast_by_title(podcast_title)
+    if podcast is not None:
+        repo.repo_instance.remove_subscription(user, podcast)
 
     return redirect(url_for('playlist_bp.playlist', podcast_title="No_Title"))
 
@@ -1,10 +1,9 @@
-import os
-
-from flask import Blueprint, render_template, request
+from flask import Blueprint, jsonify, render_template, request
 
 import podcast.adapters.repository as repo
 from podcast.domainmodel.model import Podcast, Author
 import podcast.searchbar.services as services
+from podcast.adapters.search import SUGGESTIONS, MAX_SUGGESTIONS
 
 searchbar_blueprint = Blueprint(
     'searchbar_bp', __name__)
@@ -16,92 +15,40 @@ p1 = Podcast(100, a1, "Joe Toste Podcast - Sales Training Expert")
 def searchbar():
     return render_template('search/searchbarpage.html')
 
+@searchbar_blueprint.route('/search/suggest', methods=['GET'])
+def suggest():
+    # Called as the query is typed, so it is answered from memory in both repositories
+    prefix = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', SUGGESTIONS, type=int), 1), MAX_SUGGESTIONS)
+    return jsonify({'query': prefix, 'suggestions': services.get_suggestions(prefix, limit, repo.repo_instance)})
+
 @searchbar_blueprint.route('/searchpage', methods=['GET', 'POST'])
 def searchpage():
-
-    if os.environ.get("REPOSITORY") == 'Database':
-        if request.method == 'POST':
-            query = request.form.get('query', '').lower()
-            filter_by = request.form.get('filter_by', 'title')
-        else:
-            query = request.args.get('query').lower()
-            filter_by = request.args.get('filter_by')
-
-        # test = [query, filter_by]
-
-        if filter_by == 'title':
-            podcasts = services.search_podcast_by_title(query, repo.repo_instance)
-        elif filter_by == 'author':
-            podcasts = services.search_podcast_by_author(query, repo.repo_instance)
-        elif filter_by == 'category':
-            podcasts = services.search_podcast_by_category(query, repo.repo_instance)
-
-
-        page = request.args.get('page', 1, type=int)
-        per_page = 30
-        start = (page - 1) * per_page
-        end = start + per_page
-        total_pages = (len(podcasts) + per_page - 1) // per_page
-
-        podcasts_on_page = podcasts[start:end]
-
-        boolean = False
-        if len(podcasts_on_page) == 0:
-            boolean = True
-
-
-        return render_template('search/searchpage.html',
-            podcasts=podcasts_on_page,
-            total_pages=total_pages,
-            page=page,
-            query = query,
-            filter = filter_by,
-            no_results=boolean)
-
+    if request.method == 'POST':
+        query = request.form.get('query', '').lower()
+        filter_by = request.form.get('filter_by', 'title')
     else:
-        if request.method == 'POST':
-            query = request.form.get('query', '').lower()
-            filter_by = request.form.get('filter_by', 'title')
-        else:
-            query = request.args.get('query').lower()
-            filter_by = request.args.get('filter_by')
-
-        podcasts = repo.repo_instance.get_podcasts()
-        filtered_podcasts = []
-
-        if filter_by == 'title':
-            for podcast in podcasts:
-                if query in podcast.title.lower():
-                    filtered_podcasts.append(podcast)
-        elif filter_by == 'category':
-            for podcast in podcasts:
-                category = str(podcast.get_categories).lower()
-                if query in category:
-                    filtered_podcasts.append(podcast)
-        elif filter_by == 'author':
-            for podcast in podcasts:
-                if query in podcast.author.name.lower():
-                    filtered_podcasts.append(podcast)
-
-        podcasts = filtered_podcasts
-
-        page = request.args.get('page', 1, type=int)
-        per_page = 30
-        start = (page - 1) * per_page
-        end = start + per_page
-        total_pages = (len(podcasts) + per_page - 1) // per_page
-
-        podcasts_on_page = podcasts[start:end]
-
-        boolean = False
-        if len(podcasts_on_page) == 0:
-            boolean = True
-
-        return render_template('search/searchpage.html',
-                               podcasts=podcasts_on_page,
-                               total_pages=total_pages,
-                               page=page,
-                               query=query,
-                               filter=filter_by,
-                               no_results=boolean)
-
+        query = request.args.get('query', '').lower()
+        filter_by = request.args.get('filter_by', 'title')
+
+    # Results are ranked as a whole for every query, so search pages are plain page numbers.
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 30
+
+    # Both repositories answer from a ranked index, best match first, and only load this page
+    podcast_page = services.search_podcasts_page(query, filter_by, page, per_page, repo.repo_instance)
+    total_pages = (podcast_page.total + per_page - 1) // per_page
+
+    podcasts_on_page = podcast_page.items
+
+    boolean = False
+    if len(podcasts_on_page) == 0:
+        boolean = True
+
+    return render_template('search/searchpage.html',
+                           podcasts=podcasts_on_page,
+                           total_pages=total_pages,
+                           page=page,
+                           query=query,
+                           filter=filter_by,
+                           no_results=boolean)
@@ -16,6 +16,15 @@ class InvalidPageException(Exception):
 class InvalidSearchKeyException(Exception):
     pass
 
+def search_podcasts(query: str, filter_by: str, repo: AbstractRepository):
+    return repo.search_podcasts(query, filter_by)
+
+def search_podcasts_page(query: str, filter_by: str, page: int, per_page: int, repo: AbstractRepository):
+    return repo.search_podcasts_page(query, filter_by, (page - 1) * per_page, per_page)
+
+def get_suggestions(prefix: str, limit: int, repo: AbstractRepository) -> list[dict]:
+    return [{'kind': kind, 'text': text} for kind, text in repo.suggest(prefix, limit)]
+
 def search_podcast_by_title(title_string: str, repo: AbstractRepository):
     return repo.search_podcast_by_title(title_string)
 
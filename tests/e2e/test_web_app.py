@@ -1,8 +1,13 @@
+import gc
+import os
+
 import pytest
 from flask import session
 import podcast.adapters.repository as repo
 from podcast.domainmodel.model import User
 from podcast.authentication.services import add_user
+from podcast import create_app
+from tests.conftest import TEST_DATA_PATH
 
 def test_home(client):
     response = client.get("/")
@@ -54,7 +59,26 @@ def test_searchbar(client):
     
     assert b'Onde Road - Radio Popolare' in response.data
     assert b'Brian Denny Radio' in response.data
+
+    response = client.get('/searchpage?query=church&filter_by=all')
+    assert response.status_code == 200
+    assert b'Faith Baptist Church' in response.data
+    assert b'Tallin Messages' in response.data
+    assert b'Brian Denny Radio' not in response.data
+
+    response = client.get('/searchpage?query=brain%20deny&filter_by=fuzzy')
+    assert response.status_code == 200
+    assert b'Brian Denny Radio' in response.data
     
+def test_search_suggestions(client):
+    response = client.get('/search/suggest?q=Brian%20D')
+    assert response.status_code == 200
+    assert {'kind': 'title', 'text': 'Brian Denny Radio'} in response.json['suggestions']
+
+    assert client.get('/search/suggest?q=radio&limit=1').json['suggestions'] != []
+    assert len(client.get('/search/suggest?q=r&limit=1').json['suggestions']) == 1
+    assert client.get('/search/suggest').json['suggestions'] == []
+
 def test_library(client):
     response = client.get('/library')
     assert response.status_code == 200
@@ -62,6 +86,12 @@ def test_library(client):
     assert b'Bethel Presbyterian Church (EPC) Sermons' in response.data
     assert b'Library' in response.data
     
+def test_library_with_tampered_cursor(client):
+    for token in ('eyJhZnRlciI6WzFdfQ', 'eyJiZWZvcmUiOlsxLCJ4Il19', 'not a cursor'):
+        response = client.get(f'/library?cursor={token}')
+        assert response.status_code == 200
+        assert b'Current Page 1 of' in response.data
+    
 def test_playlist_not_logged_in(client):
     response = client.get('/playlist/No_Title')
     assert response.status_code == 302
@@ -87,3 +117,33 @@ def test_user_review(client, auth):
 
 
     
+
+def test_podcast_description_from_episode_store(tmp_path):
+    my_app = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'EPISODE_STORE': tmp_path / 'episodes.store',
+    })
+    response = my_app.test_client().get("/podcast_description/Brian%20Denny%20Radio")
+    assert response.status_code == 200
+    assert b'5-in-1: Brian Denny' in response.data
+
+def test_preloaded_app_reports_memory(tmp_path):
+    my_app = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'PRELOAD': True,
+    })
+    gc.unfreeze()
+    assert repo.repo_instance.frozen
+
+    client = my_app.test_client()
+    assert client.get('/library').status_code == 200
+
+    response = client.get('/diagnostics/memory')
+    assert response.status_code == 200
+    assert response.json['pid'] == os.getpid()
+    if 'rss_kb' in response.json:
+        assert response.json['shared_kb'] + response.json['unique_kb'] == response.json['rss_kb']
@@ -1,6 +1,23 @@
+import csv
+import os
+import shutil
+
 import pytest
-from podcast.adapters.memory_repository import MemoryRepository
-from podcast.domainmodel.model import Podcast, Author
+from pathlib import Path
+from podcast.adapters.memory_repository import MemoryRepository, populate
+from podcast.adapters.repository import RepositoryException, podcast_sort_key
+from podcast.adapters.datareader import snapshot
+from podcast.adapters.datareader.snapshot import file_sha256, load_catalog, read_snapshot
+from podcast.adapters.datareader.csvdatareader import CSVDataReader
+from podcast.adapters.episode_store import (EpisodeStore, EpisodeView, move_episodes_to_store, store_is_current,
+                                            write_episode_store)
+from podcast.adapters.cache import QueryCache, id_list_size
+from podcast.adapters.search import FuzzyIndex, SearchIndex, SuggestionIndex, edit_distance, normalize_query
+from podcast.domainmodel.model import Podcast, Author, Category, Episode, User
+import podcast.library.services as library_services
+from podcast import create_search_cache
+
+TEST_DATA_PATH = Path(__file__).parent.parent / "test_data"
 
 @pytest.fixture
 def my_memory_repo():
@@ -27,3 +44,474 @@ def test_memory_repo_get_number_of_podcasts(my_memory_repo,my_podcast):
     assert my_memory_repo.get_number_of_podcasts() ==  0
     my_memory_repo.add_podcast(my_podcast)
     assert my_memory_repo.get_number_of_podcasts() ==  1
+
+
+def test_catalog_snapshot_is_reused_until_sources_change(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    for file_name in ['podcasts.csv', 'episodes.csv']:
+        shutil.copy(TEST_DATA_PATH / file_name, tmp_path / file_name)
+    snapshot_path = tmp_path / 'catalog.snapshot'
+    sources = [tmp_path / 'podcasts.csv', tmp_path / 'episodes.csv']
+
+    catalog = load_catalog(tmp_path, snapshot_path)
+    assert snapshot_path.exists()
+
+    snapshot_catalog = read_snapshot(snapshot_path, sources)
+    assert snapshot_catalog.podcasts == catalog.podcasts
+    assert snapshot_catalog.podcasts[0].episodes == catalog.podcasts[0].episodes
+    assert snapshot_catalog.podcasts[0].author is snapshot_catalog.authors[0]
+
+    # A snapshot repository is populated like a CSV one
+    repo = MemoryRepository()
+    populate(repo, tmp_path, snapshot_catalog)
+    assert repo.get_number_of_podcasts() == 14
+
+    # Keep only the header and the first ten episodes
+    with open(tmp_path / 'episodes.csv', newline='') as episodes_file:
+        rows = list(csv.reader(episodes_file))[:11]
+    with open(tmp_path / 'episodes.csv', 'w', newline='') as episodes_file:
+        csv.writer(episodes_file).writerows(rows)
+    assert read_snapshot(snapshot_path, sources) is None
+
+    assert len(load_catalog(tmp_path, snapshot_path).episodes) == 10
+    assert read_snapshot(snapshot_path, sources) is not None
+
+
+def test_catalog_snapshot_records_new_mtimes_of_unchanged_sources(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    shutil.copy(TEST_DATA_PATH / 'podcasts.csv', tmp_path)
+    shutil.copy(TEST_DATA_PATH / 'episodes.csv', tmp_path)
+    sources = [tmp_path / 'podcasts.csv', tmp_path / 'episodes.csv']
+    snapshot_path = tmp_path / 'catalog.snapshot'
+    load_catalog(tmp_path, snapshot_path)
+
+    os.utime(sources[1], ns=(10 ** 18, 10 ** 18))
+    hashed = []
+    monkeypatch.setattr(snapshot, 'file_sha256', lambda path: hashed.append(path) or file_sha256(path))
+    assert len(read_snapshot(snapshot_path, sources).episodes) == 15
+    assert hashed == [sources[1]]
+
+    # The next start finds the new mtime recorded and hashes nothing
+    assert len(read_snapshot(snapshot_path, sources).episodes) == 15
+    assert hashed == [sources[1]]
+
+
+def test_catalog_snapshot_ignores_other_versions(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    snapshot_path = tmp_path / 'catalog.snapshot'
+    sources = [TEST_DATA_PATH / 'podcasts.csv', TEST_DATA_PATH / 'episodes.csv']
+    load_catalog(TEST_DATA_PATH, snapshot_path)
+
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1)
+    assert read_snapshot(snapshot_path, sources) is None
+
+
+def test_episode_store_views_match_episodes(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    reader = CSVDataReader(TEST_DATA_PATH)
+    catalog = reader.read_catalog()
+    episodes_by_podcast = {podcast.id: list(podcast.episodes) for podcast in catalog.podcasts}
+
+    store = move_episodes_to_store(catalog, tmp_path / 'episodes.store', reader.source_pathways())
+    assert catalog.episodes == []
+
+    for podcast in catalog.podcasts:
+        episodes = episodes_by_podcast[podcast.id]
+        assert len(podcast.get_episodes) == len(episodes)
+        for episode, view in zip(episodes, podcast.get_episodes):
+            assert isinstance(view, EpisodeView)
+            assert view == episode
+            assert view.episode_name == episode.episode_name
+            assert view.episode_description == episode.episode_description
+            assert view.publication_date == episode.publication_date
+            assert view.link_to_audio == episode.link_to_audio
+            assert view.integer_into_time() == episode.integer_into_time()
+            assert podcast.get_episode_with_id(episode.episode_id) == episode
+
+    podcast = [podcast for podcast in catalog.podcasts if podcast.id == 14][0]
+    assert podcast.get_episodes.find(podcast.get_episodes[0].episode_id) == podcast.get_episodes[0]
+    assert store.episodes_for_podcast(123456) == []
+
+
+def test_episode_store_podcasts_can_still_change_episodes(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    reader = CSVDataReader(TEST_DATA_PATH)
+    catalog = reader.read_catalog()
+    move_episodes_to_store(catalog, tmp_path / 'episodes.store', reader.source_pathways())
+    podcast = [podcast for podcast in catalog.podcasts if len(podcast.episodes) > 0][0]
+    first = podcast.episodes[0]
+    count = len(podcast.episodes)
+
+    # The first change copies the podcast's episodes out of the store
+    episode = Episode('New', '60', 'notes', '2017-01-01', 99999, 'audio', podcast.id)
+    podcast.add_episode(episode)
+    assert isinstance(podcast.episodes, list)
+    assert podcast.episodes[-1] is episode
+    assert len(podcast.episodes) == count + 1
+
+    podcast.remove_episode(first)
+    assert first not in podcast.episodes
+    assert len(podcast.episodes) == count
+
+
+def test_episode_store_is_rewritten_when_sources_change(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    store_path = tmp_path / 'episodes.store'
+    sources = [TEST_DATA_PATH / 'podcasts.csv', TEST_DATA_PATH / 'episodes.csv']
+
+    move_episodes_to_store(CSVDataReader(TEST_DATA_PATH).read_catalog(), store_path, sources)
+    assert len(EpisodeStore(store_path)) == 15
+
+    # An up to date store is reused as it is, however old it looks
+    os.utime(store_path, ns=(0, 0))
+    assert store_is_current(store_path, sources, 15)
+    move_episodes_to_store(CSVDataReader(TEST_DATA_PATH).read_catalog(), store_path, sources)
+    assert os.stat(store_path).st_mtime_ns == 0
+
+    # A store holding other episodes is rebuilt
+    write_episode_store(store_path, [], sources)
+    assert not store_is_current(store_path, sources, 15)
+    move_episodes_to_store(CSVDataReader(TEST_DATA_PATH).read_catalog(), store_path, sources)
+    assert len(EpisodeStore(store_path)) == 15
+
+
+def test_episode_store_built_from_other_files_is_not_reused(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    data_path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH, data_path)
+    sources = [data_path / 'podcasts.csv', data_path / 'episodes.csv']
+    store_path = tmp_path / 'episodes.store'
+    write_episode_store(store_path, [], sources)
+
+    # Same size, different contents, and a store that looks newer than the CSV files
+    with open(sources[1], 'r+b') as episodes_file:
+        episodes_file.seek(-2, os.SEEK_END)
+        episodes_file.write(b'XX')
+    os.utime(sources[1], ns=(0, 0))
+    assert not store_is_current(store_path, sources)
+
+    assert not store_is_current(tmp_path / 'missing.store', sources)
+    with open(store_path, 'wb') as store_file:
+        store_file.write(b'not a store')
+    assert not store_is_current(store_path, sources)
+
+
+def test_episode_store_defaults_malformed_lengths(tmp_path, my_podcast):
+    episodes = [Episode('Good', '90', 'notes', '2017-01-01', 1, 'audio', my_podcast.id),
+                Episode('Bad', 'n/a', 'notes', '2017-01-01', 2, 'audio', my_podcast.id)]
+    write_episode_store(tmp_path / 'episodes.store', episodes)
+
+    store = EpisodeStore(tmp_path / 'episodes.store')
+    assert list(store.lengths) == [90, 0]
+    assert [view.episode_name for view in store.episodes_for_podcast(my_podcast.id)] == ['Good', 'Bad']
+
+
+def test_memory_repo_freeze(in_memory_repo, my_podcast):
+    in_memory_repo.freeze()
+
+    assert in_memory_repo.frozen
+    assert isinstance(in_memory_repo.get_podcasts(), tuple)
+    assert in_memory_repo.get_number_of_podcasts() == 14
+    podcast = in_memory_repo.get_podcasts()[0]
+    assert isinstance(podcast.categories, tuple)
+    assert isinstance(podcast.get_episodes, tuple)
+    assert isinstance(podcast.author.podcast_list, tuple)
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.add_podcast(my_podcast)
+    assert in_memory_repo.get_number_of_podcasts() == 14
+
+
+def test_memory_repo_indexes(in_memory_repo):
+    podcast = in_memory_repo.get_podcasts()[0]
+    assert in_memory_repo.get_podcast_by_id(podcast.id) is podcast
+    assert in_memory_repo.get_podcast_by_title(podcast.title) is podcast
+    assert in_memory_repo.get_podcast_by_id(-1) is None
+    assert in_memory_repo.get_podcast_by_title("Not a podcast") is None
+
+    by_author = in_memory_repo.get_podcasts_by_author(podcast.author.id)
+    assert podcast in by_author
+    assert all(item.author is podcast.author for item in by_author)
+
+    category = podcast.categories[0]
+    by_category = in_memory_repo.get_podcasts_by_category(category.id)
+    assert by_category == sorted(item for item in in_memory_repo.get_podcasts() if category in item.categories)
+    assert in_memory_repo.get_podcasts_by_category(-1) == []
+
+
+def test_memory_repo_keeps_first_podcast_with_an_id(my_memory_repo, my_author):
+    first, duplicate = Podcast(7, my_author, "First Show"), Podcast(7, my_author, "Duplicate Show")
+    my_memory_repo.add_podcast(first)
+    my_memory_repo.add_podcast(duplicate)
+
+    assert my_memory_repo.get_podcasts() == [first]
+    assert my_memory_repo.get_podcast_by_id(7) is first
+    assert my_memory_repo.get_podcast_by_title("Duplicate Show") is None
+    assert my_memory_repo.get_podcasts_by_author(my_author.id) == [first]
+    assert my_memory_repo.search_podcasts('duplicate', 'title') == []
+    assert my_memory_repo.search_podcasts('first', 'title') == [first]
+
+
+def test_memory_repo_indexes_order_same_titles_by_id(my_memory_repo, my_author):
+    category = Category(1, "Comedy")
+    for podcast_id in (3, 1, 2):
+        podcast = Podcast(podcast_id, my_author, "Same Title")
+        podcast.add_category(category)
+        my_memory_repo.add_podcast(podcast)
+
+    assert [podcast.id for podcast in my_memory_repo.get_podcasts()] == [1, 2, 3]
+    assert [podcast.id for podcast in my_memory_repo.get_podcasts_by_author(my_author.id)] == [1, 2, 3]
+    assert [podcast.id for podcast in my_memory_repo.get_podcasts_by_category(category.id)] == [1, 2, 3]
+
+
+def test_memory_repo_get_user_by_name(my_memory_repo):
+    user = User(1, "Shyamli", "pw12345678")
+    my_memory_repo.add_user(user)
+    assert my_memory_repo.get_user("shyamli") is user
+    assert my_memory_repo.get_user("  SHYAMLI ") is user
+    assert my_memory_repo.get_user("nobody") is None
+
+
+def test_memory_repo_subscriptions(in_memory_repo):
+    user = User(1, "Shyamli", "pw12345678")
+    first, second = in_memory_repo.get_podcast_by_id(3), in_memory_repo.get_podcast_by_id(2)
+
+    assert in_memory_repo.add_subscription(user, first)
+    assert in_memory_repo.add_subscription(user, second)
+    assert not in_memory_repo.add_subscription(user, first)
+    assert in_memory_repo.get_subscriptions(user) == [first, second]
+
+    assert in_memory_repo.remove_subscription(user, first)
+    assert not in_memory_repo.remove_subscription(user, first)
+    assert in_memory_repo.get_subscriptions(user) == [second]
+    # The favorited episodes are kept first
+    assert user.subscription_list[0].title == "Favorited Episodes"
+
+
+def test_memory_repo_search_podcasts(in_memory_repo):
+    assert [podcast.id for podcast in in_memory_repo.search_podcasts('radio', 'title')] == [2, 3]
+    # The last term is matched as a prefix
+    assert [podcast.id for podcast in in_memory_repo.search_podcasts('rad', 'title')] == [2, 3]
+    assert sorted(podcast.id for podcast in in_memory_repo.search_podcasts('religion', 'category')) == [4, 5, 9, 10, 15]
+    assert [podcast.id for podcast in in_memory_repo.search_podcasts('greg burdine', 'author')] == [9]
+    # Every term has to match
+    assert in_memory_repo.search_podcasts('radio comedy', 'title') == []
+    assert in_memory_repo.search_podcasts('', 'all') == []
+
+
+def test_search_index_ranks_by_bm25():
+    index = SearchIndex()
+    index.add(1, {'title': 'Morning News', 'description': 'news news news from the morning'})
+    index.add(2, {'title': 'Evening Show', 'description': 'a show with some news'})
+    index.add(3, {'title': 'Comedy Hour'})
+
+    # A title match outweighs description matches
+    assert index.search('news') == [1, 2]
+    assert index.search('news', 'title') == [1]
+    assert index.search('news', 'title', prefix=False) == [1]
+    assert index.search('new', 'title', prefix=False) == []
+
+    # Re-adding a podcast replaces its entry
+    index.add(1, {'title': 'Morning Comedy'})
+    assert index.search('news') == [2]
+    # Equal scores fall back to id order
+    assert index.search('comedy') == [1, 3]
+    assert len(index) == 3
+
+
+def test_memory_repo_get_podcasts_page(in_memory_repo):
+    page = in_memory_repo.get_podcasts_page(0, 5)
+    assert page.total == 14
+    assert page.items == list(in_memory_repo.get_podcasts()[:5])
+
+    page = in_memory_repo.get_podcasts_page(10, 5)
+    assert [podcast.title for podcast in page.items] == ['Roy Green Show', 'Tallin Messages',
+                                                          'The Mandarian Orange Show', 'Why Did You Run?']
+
+    page = in_memory_repo.get_podcasts_page(3, 3, sort='id')
+    assert [podcast.id for podcast in page.items] == [5, 6, 7]
+    assert in_memory_repo.get_podcasts_page(100, 5).items == []
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.get_podcasts_page(0, 5, sort='rating')
+
+
+def test_memory_repo_search_podcasts_page(in_memory_repo):
+    page = in_memory_repo.search_podcasts_page('religion', 'category', 2, 2)
+    assert page.total == 5
+    assert page.items == in_memory_repo.search_podcasts('religion', 'category')[2:4]
+
+
+def test_memory_repo_get_podcasts_page_with_cursors(in_memory_repo):
+    by_offset = [in_memory_repo.get_podcasts_page(offset, 4).items for offset in range(0, 14, 4)]
+
+    after = podcast_sort_key(by_offset[1][-1])
+    assert in_memory_repo.get_podcasts_page(0, 4, after=after).items == by_offset[2]
+    before = podcast_sort_key(by_offset[2][0])
+    assert in_memory_repo.get_podcasts_page(0, 4, before=before).items == by_offset[1]
+    assert in_memory_repo.get_podcasts_page(0, 2, last=True).items == by_offset[3]
+
+
+def test_library_cursors_walk_every_page(in_memory_repo):
+    per_page = 4
+    page, cursor, seen = 1, None, []
+    while True:
+        podcast_page = library_services.get_podcasts_page(page, per_page, in_memory_repo, cursor)
+        seen.extend(podcast_page.items)
+        cursors = library_services.get_page_cursors(podcast_page.items, page, per_page, podcast_page.total)
+        if 'next' not in cursors:
+            break
+        cursor = library_services.decode_cursor(cursors['next'])
+        page = cursor['page']
+    assert page == 4
+    assert seen == list(in_memory_repo.get_podcasts())
+
+    # Walking back from the last page gives the same pages as offsets
+    cursor = library_services.decode_cursor(cursors['last'])
+    assert library_services.get_podcasts_page(cursor['page'], per_page, in_memory_repo, cursor).items == seen[12:]
+    previous = library_services.decode_cursor(
+        library_services.get_page_cursors(seen[12:], 4, per_page, 14)['previous'])
+    assert previous['page'] == 3
+    assert library_services.get_podcasts_page(3, per_page, in_memory_repo, previous).items == seen[8:12]
+
+    assert library_services.decode_cursor('not a cursor') == {}
+
+
+@pytest.mark.parametrize('cursor', [[1], {'after': [1]}, {'after': 'Radio'}, {'before': [1, 'x']},
+                                    {'after': ['Radio', 1, 2]}, {'after': ['Radio', True]},
+                                    {'after': ['Radio', 1], 'before': ['Radio', 2]}, {'last': 'all'},
+                                    {'last': 2, 'after': ['Radio', 1]}, {'page': '2'}, {'offset': 10}])
+def test_library_ignores_malformed_cursors(in_memory_repo, cursor):
+    token = library_services.encode_cursor(cursor)
+    assert library_services.decode_cursor(token) == {}
+    first_page = in_memory_repo.get_podcasts_page(0, 4).items
+    assert library_services.get_podcasts_page(1, 4, in_memory_repo, library_services.decode_cursor(token)).items == first_page
+
+
+def test_memory_repo_get_rating_summary(in_memory_repo):
+    podcast = in_memory_repo.get_podcast_by_id(2)
+    for rating in [5.0, 4.0, 4.5]:
+        podcast.add_user_review(rating)
+
+    summary = in_memory_repo.get_rating_summary(2)
+    assert (summary.count, summary.average) == (3, 4.5)
+    assert summary.histogram == {1: 0, 2: 0, 3: 0, 4: 2, 5: 1}
+    assert in_memory_repo.get_rating_summary(-1).count == 0
+
+
+def test_search_cache_settings():
+    assert create_search_cache(None, None).stats()['max_entries'] == 500
+    assert create_search_cache('', '').stats()['max_bytes'] == 4096 * 1024
+    assert create_search_cache('20', '8').stats()['max_bytes'] == 8 * 1024
+    # An explicit 0 turns the cache off rather than falling back to the default
+    assert create_search_cache(0, None) is None
+    assert create_search_cache('0', None) is None
+    assert create_search_cache(None, 0) is None
+
+
+def test_memory_repo_search_cache():
+    repo = MemoryRepository(QueryCache(max_bytes=1 << 20, sizeof=id_list_size))
+    populate(repo, TEST_DATA_PATH)
+    cache = repo.search_cache
+
+    first = repo.search_podcasts_page('Radio', 'title', 0, 1)
+    second = repo.search_podcasts_page(' radio!', 'title', 1, 1)
+    assert (cache.misses, cache.hits, len(cache)) == (1, 1, 1)
+    assert [podcast.title for podcast in first.items + second.items] == \
+        [podcast.title for podcast in repo.search_podcasts('radio', 'title')]
+    assert normalize_query('"Brian  Denny"') == '"brian denny"'
+
+    # Adding a podcast clears the cached results
+    podcast = Podcast(9999, Author(9999, 'Cache Author'), 'Cache Radio')
+    repo.add_podcast(podcast)
+    assert len(cache) == 0
+    assert podcast in repo.search_podcasts('radio', 'title')
+
+
+def test_memory_repo_suggest(in_memory_repo):
+    suggestions = in_memory_repo.suggest('radio')
+    assert ('title', 'Brian Denny Radio') in suggestions
+    assert ('title', 'Onde Road - Radio Popolare') in suggestions
+    assert in_memory_repo.suggest('RADIO P') == [('author', 'Radio Popolare'), ('title', 'Onde Road - Radio Popolare')]
+    assert len(in_memory_repo.suggest('r', limit=2)) == 2
+    assert in_memory_repo.suggest('') == []
+    assert in_memory_repo.suggest('zzzz') == []
+
+
+def test_suggestion_index_ranking():
+    index = SuggestionIndex([('title', 'Radio Days', 1), ('author', 'Radio Collective', 3),
+                             ('title', 'Late Night Radio', 1), ('category', 'Comedy', 5)])
+    # Names starting with the prefix come first, then those with more podcasts
+    assert index.suggest('radio') == [('author', 'Radio Collective'), ('title', 'Radio Days'),
+                                      ('title', 'Late Night Radio')]
+    assert index.suggest('radio ') == [('author', 'Radio Collective'), ('title', 'Radio Days')]
+    assert index.suggest('co', limit=1) == [('category', 'Comedy')]
+
+
+def test_suggestion_index_short_prefixes_match_a_full_scan():
+    entries = [('title', 'A', 1), ('title', 'Ab Show', 1), ('author', 'Ab', 4), ('title', 'Ac', 1),
+               ('category', 'Abc', 2), ('title', 'Late Ab', 1), ('title', 'B', 1)]
+    index = SuggestionIndex(entries)
+
+    # Prefixes of up to three characters are answered from the ranking made up front
+    assert index.suggest('a') == [('author', 'Ab'), ('category', 'Abc'), ('title', 'A'), ('title', 'Ab Show'),
+                                  ('title', 'Ac'), ('title', 'Late Ab')]
+    assert index.suggest('ab', limit=2) == [('author', 'Ab'), ('category', 'Abc')]
+    assert index.suggest('ab ') == [('title', 'Ab Show')]
+    assert index.suggest('ab s') == [('title', 'Ab Show')]
+    assert index.suggest('abcd') == []
+    assert index.suggest('x') == []
+
+
+def test_memory_repo_fuzzy_search(in_memory_repo):
+    assert [podcast.id for podcast in in_memory_repo.search_podcasts('brain deny', 'fuzzy')] == [2]
+    assert [podcast.id for podcast in in_memory_repo.search_podcasts('greg burdin', 'fuzzy')] == [9]
+    assert in_memory_repo.search_podcasts('zzzzzz', 'fuzzy') == []
+    assert in_memory_repo.search_podcasts('', 'fuzzy') == []
+
+
+def test_fuzzy_index_ranks_by_edits():
+    index = FuzzyIndex()
+    index.add(1, {'title': 'History of Rome'})
+    index.add(2, {'title': 'Histories', 'author': 'Rome Radio'})
+    index.add(3, {'title': 'Comedy Hour'})
+
+    assert index.search('history') == [1]
+    # Fewer typos rank first, then title matches before author matches
+    assert index.search('histroy rome') == [1]
+    assert index.search('rome') == [1, 2]
+    assert index.search('comdy') == [3]
+    # Short words have to match exactly
+    assert index.search('of') == [1]
+    assert index.search('on') == []
+
+    index.remove(1)
+    assert index.search('rome') == [2]
+    assert len(index) == 2
+
+
+def test_fuzzy_index_only_compares_close_candidates():
+    index = FuzzyIndex()
+    index.add(1, {'title': 'science sciences scientific sci nonsense license essence silence seance scene since'})
+    index.add(2, {'author': 'Brian Denny'})
+
+    # Words of other lengths, or sharing too few trigrams, never reach the edit distance pass
+    assert len(index.candidate_terms('sciense', 2)) == 5
+    assert len(index.candidates('sciense')) == 4
+    assert index.search('sciense') == [1]
+    # Swapped letters are found even though they change more trigrams than an edit usually does
+    assert index.search('brain') == [2]
+    index.add(3, {'title': 'Christian Presbyterian Sermons'})
+    # Two swaps, and a swap next to another edit
+    assert index.search('chrsitain') == [3]
+    assert index.search('presbyetrain') == [3]
+    assert index.search('chrsitiam') == [3]
+    assert index.search('chrsitian presbyetrain') == [3]
+
+
+def test_edit_distance():
+    assert edit_distance('podcast', 'podcast', 2) == 0
+    assert edit_distance('podcats', 'podcast', 2) == 1
+    assert edit_distance('kitten', 'sitting', 3) == 3
+    # Gives up once the distance is over the limit
+    assert edit_distance('abcdef', 'uvwxyz', 2) > 2
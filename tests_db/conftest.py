@@ -1,13 +1,14 @@
 import pytest
 import sys
 import os
+from contextlib import contextmanager
 from pathlib import Path
 
 # Add the root directory to sys.path
 project_root = Path(__file__).resolve().parent.parent  # Adjust the number of parent calls if necessary
 sys.path.insert(0, str(project_root))
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
 from podcast.adapters import database_repository, populate_repository
@@ -25,6 +26,22 @@ TEST_DATABASE_URI_FILE = 'sqlite:///podcasts-test.db'
 os.environ['REPOSITORY'] = 'Database'
 os.environ['TESTING'] = 'True'
 
+
+@contextmanager
+def count_queries(engine):
+    """Collects the SQL statements the engine runs inside the block."""
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record_statement)
+
+
 @pytest.fixture(scope="session")
 def database_setup():
     # Initiate .env variables
@@ -53,6 +70,21 @@ def database_setup():
     with engine.connect() as connection:
         mapper_registry.metadata.drop_all(connection)
 
+@pytest.fixture
+def empty_database():
+    clear_mappers()
+    engine = create_engine(TEST_DATABASE_URI_IN_MEMORY)
+
+    # Create empty tables and map the domain model onto them
+    mapper_registry.metadata.create_all(engine)
+    map_model_to_tables()
+
+    session_factory = sessionmaker(autocommit=False, autoflush=True, bind=engine)
+
+    yield engine, session_factory
+
+    mapper_registry.metadata.drop_all(engine)
+
 @pytest.fixture
 def empty_session():
     clear_mappers()
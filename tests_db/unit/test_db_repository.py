@@ -2,9 +2,18 @@ from datetime import date, datetime
 
 import pytest
 
+from sqlalchemy import text
+
 import podcast.adapters.repository as repo
+from podcast.adapters import fulltext, populate_repository
+from podcast.adapters.cache import QueryCache, id_list_size
 from podcast.adapters.database_repository import SqlAlchemyRepository
+from podcast.adapters.memory_repository import MemoryRepository, populate
+from podcast.adapters.engine import create_database_engine
+from podcast.adapters.repository import podcast_sort_key
 from podcast.domainmodel.model import User, Author, Podcast, Comment, Category, Episode, Review, Playlist
+from tests.conftest import TEST_DATA_PATH
+from tests_db.conftest import count_queries, data_path_tests
 
 
 def test_repository_can_add_a_user(database_setup):
@@ -91,7 +100,7 @@ def test_repository_can_retrieve_categories(database_setup):
 
     categories = repo.repo_instance.get_categories()
 
-    assert len(categories) == 25
+    assert len(categories) == 11
 
 
 def test_repository_can_get_first_article(database_setup):
@@ -111,7 +120,7 @@ def test_repository_can_add_a_category(database_setup):
 
     category = repo.repo_instance.get_category('Thriller')
 
-    assert repr(category) == "<Category 26: Thriller>"
+    assert repr(category) == "<Category 12: Thriller>"
 
 
 def test_repository_can_search_podcasts_by_title(database_setup):
@@ -122,7 +131,11 @@ def test_repository_can_search_podcasts_by_title(database_setup):
     podcast_results_2 = repo.repo_instance.search_podcast_by_title('b')
 
     assert repr(podcast_results_1) == "[<Podcast 10: 'Bridge Christian Community' by Bridge Christian Community, Dubuque, Iowa>]"
-    assert len(podcast_results_2) == 5
+    # Terms are matched by prefix, so 'b' finds Bethel, Brian, Bridge and Baptist but no longer 'Table'
+    assert sorted(podcast.id for podcast in podcast_results_2) == [2, 5, 9, 10]
+    # Quoted queries are matched as a phrase
+    assert [podcast.id for podcast in repo.repo_instance.search_podcast_by_title('"christian community"')] == [10]
+    assert repo.repo_instance.search_podcast_by_title('"community christian"') == []
 
 
 def test_repository_can_search_podcasts_by_author(database_setup):
@@ -140,7 +153,7 @@ def test_repository_can_search_podcasts_by_category(database_setup):
 
     podcast_results = repo.repo_instance.search_podcast_by_category('Religion')
 
-    assert repr(podcast_results) == "[<Podcast 4: 'Tallin Messages' by Tallin Country Church>]"
+    assert sorted(podcast.id for podcast in podcast_results) == [4, 5, 9, 10, 15]
 
 
 def test_repository_can_retrieve_podcasts(database_setup):
@@ -153,3 +166,355 @@ def test_repository_can_retrieve_podcasts(database_setup):
 
 
 
+
+
+def test_repository_can_search_podcasts(database_setup):
+    engine, session_factory = database_setup
+    repo.repo_instance = SqlAlchemyRepository(session_factory)
+
+    assert sorted(podcast.id for podcast in repo.repo_instance.search_podcasts('rad', 'title')) == [2, 3]
+    assert sorted(podcast.id for podcast in repo.repo_instance.search_podcasts('church', 'all')) == [4, 5, 9]
+    assert repo.repo_instance.search_podcasts('xyz', 'all') == []
+
+
+def test_repository_search_falls_back_without_search_table(empty_database):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory)
+    populate_repository.populate_db(data_path_tests, repository)
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE podcast_search'))
+
+    repository = SqlAlchemyRepository(session_factory)
+    assert [podcast.id for podcast in repository.search_podcast_by_author('Greg Burdine')] == [9]
+    assert sorted(podcast.id for podcast in repository.search_podcasts('rad', 'title')) == [2, 3]
+
+    # The search table is recreated for databases that do not have one yet
+    repository.ensure_search_index()
+    assert sorted(podcast.id for podcast in repository.search_podcasts('rad', 'title')) == [2, 3]
+
+
+def test_repository_search_table_follows_new_podcasts(empty_database):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory)
+    populate_repository.populate_db(data_path_tests, repository)
+
+    author = repository.get_author(9)
+    podcast = Podcast(500, author, 'Zebra Crossings')
+    repository.add_multiple_podcasts([podcast])
+    assert [podcast.id for podcast in repository.search_podcast_by_title('zebra')] == [500]
+
+
+def test_repository_prefix_search_matches_memory_repository(empty_database, monkeypatch):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory)
+    populate_repository.populate_db(data_path_tests, repository)
+    monkeypatch.setenv('REPOSITORY', 'Memory')
+    memory_repository = MemoryRepository()
+    populate(memory_repository, TEST_DATA_PATH)
+
+    # More words start with "zeb" than a capped prefix expansion would cover
+    author = repository.get_author(9)
+    repository.add_multiple_podcasts([Podcast(500 + number, author, f'Zeb{number:02d} Show') for number in range(60)])
+    for number in range(60):
+        memory_repository.add_podcast(Podcast(500 + number, author, f'Zeb{number:02d} Show'))
+
+    for query, filter_by in (('zeb', 'title'), ('s', 'title'), ('b', 'all'), ('a', 'author')):
+        database_ids = repository.search_podcast_ids(query, filter_by)
+        memory_ids = memory_repository.search_podcast_ids(query, filter_by)
+        assert sorted(database_ids) == sorted(memory_ids)
+        assert repository.search_podcasts_page(query, filter_by, 0, 5).total == len(memory_ids)
+    assert len(memory_repository.search_podcast_ids('zeb', 'title')) == 60
+
+
+def test_repository_refreshes_search_rows_in_batches(empty_database, monkeypatch):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory)
+    populate_repository.populate_db(data_path_tests, repository)
+    monkeypatch.setattr(fulltext, 'REFRESH_BATCH_SIZE', 7)
+
+    author = repository.get_author(9)
+    repository.add_multiple_podcasts([Podcast(500 + number, author, f'Zebra {number}') for number in range(20)])
+    assert sorted(repository.search_podcast_ids('zebra', 'title')) == list(range(500, 520))
+
+
+def test_repository_can_page_podcasts(database_setup):
+    engine, session_factory = database_setup
+    repo.repo_instance = SqlAlchemyRepository(session_factory)
+
+    page = repo.repo_instance.get_podcasts_page(10, 5)
+    assert page.total == 14
+    assert [podcast.title for podcast in page.items] == ['Roy Green Show', 'Tallin Messages',
+                                                          'The Mandarian Orange Show', 'Why Did You Run?']
+    assert [podcast.id for podcast in repo.repo_instance.get_podcasts_page(3, 3, sort='id').items] == [5, 6, 7]
+
+    page = repo.repo_instance.search_podcasts_page('religion', 'category', 2, 2)
+    assert page.total == 5
+    assert page.items == repo.repo_instance.search_podcasts('religion', 'category')[2:4]
+
+
+def test_repository_can_page_podcasts_with_cursors(database_setup):
+    engine, session_factory = database_setup
+    repo.repo_instance = SqlAlchemyRepository(session_factory)
+
+    by_offset = [repo.repo_instance.get_podcasts_page(offset, 4).items for offset in range(0, 14, 4)]
+    after = podcast_sort_key(by_offset[1][-1])
+    assert repo.repo_instance.get_podcasts_page(0, 4, after=after).items == by_offset[2]
+    before = podcast_sort_key(by_offset[2][0])
+    assert repo.repo_instance.get_podcasts_page(0, 4, before=before).items == by_offset[1]
+    assert repo.repo_instance.get_podcasts_page(0, 2, last=True).items == by_offset[3]
+    assert repo.repo_instance.get_podcasts_page(0, 3, sort='id', after=[5]).items[0].id == 6
+
+
+def test_database_engine_pools_connections(tmp_path):
+    database_engine = create_database_engine(f'sqlite:///{tmp_path / "pooled.db"}', 'queue', 2)
+    with database_engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        # NORMAL is 1
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1
+        first_connection = connection.connection.dbapi_connection
+    with database_engine.connect() as connection:
+        assert connection.connection.dbapi_connection is first_connection
+
+    with pytest.raises(ValueError):
+        create_database_engine('sqlite://', 'huge')
+    # One shared connection would mean one shared transaction for every request
+    with pytest.raises(ValueError):
+        create_database_engine(f'sqlite:///{tmp_path / "pooled.db"}', 'static')
+    assert create_database_engine('sqlite://', 'static').pool.__class__.__name__ == 'StaticPool'
+
+
+def test_repository_session_is_replaced_per_request(database_setup):
+    engine, session_factory = database_setup
+    repository = SqlAlchemyRepository(session_factory)
+
+    session = repository._session_cm.session()
+    repository.reset_session()
+    assert repository._session_cm.session() is not session
+    assert repository.get_number_of_podcasts() == 14
+    repository.close_session()
+
+
+def test_repository_loads_podcast_details_in_bounded_queries(database_setup):
+    engine, session_factory = database_setup
+    repository = SqlAlchemyRepository(session_factory)
+
+    with count_queries(engine) as statements:
+        podcast = repository.get_podcast_details('The Mandarian Orange Show')
+        details = (podcast.author.name, podcast.get_categories, [episode.episode_id for episode in podcast.get_episodes])
+
+    assert details == ('Janelle Vecchio and Phil Vecchio', ['Comedy'], [1])
+    assert len(statements) == 3
+    assert repository.get_podcast_details('Not a podcast') is None
+    repository.close_session()
+
+
+def render_cards(podcasts) -> list:
+    # What the library, search and playlist templates read from each podcast
+    return [(podcast.title, podcast.author.name, podcast.get_categories) for podcast in podcasts]
+
+
+@pytest.mark.parametrize('limit', [3, 10])
+def test_repository_list_pages_use_fixed_queries(database_setup, limit):
+    engine, session_factory = database_setup
+    repository = SqlAlchemyRepository(session_factory)
+    repository.ensure_search_index()
+    repository.close_session()
+
+    # The page, its count and the categories of the podcasts on it
+    with count_queries(engine) as statements:
+        cards = render_cards(repository.get_podcasts_page(0, limit).items)
+    assert len(cards) == limit
+    assert len(statements) == 3
+    repository.close_session()
+
+    with count_queries(engine) as statements:
+        render_cards(repository.get_podcasts_page(0, limit, after=('B', 0)).items)
+    assert len(statements) == 3
+    repository.close_session()
+
+    # The matching ids, their count, the podcasts and their categories
+    with count_queries(engine) as statements:
+        cards = render_cards(repository.search_podcasts_page('a', 'all', 0, limit).items)
+    assert len(cards) == limit
+    assert len(statements) == 4
+    repository.close_session()
+
+    with count_queries(engine) as statements:
+        render_cards(repository.get_podcasts_by_category(1))
+    assert len(statements) == 2
+    repository.close_session()
+
+
+def add_ratings(repository, podcast, ratings):
+    for position, rating in enumerate(ratings):
+        repository.add_user(User(None, f'rater{position}', 'rater12345'))
+        user = repository.get_user(f'rater{position}')
+        repository.add_review(Review(None, podcast, user, rating, f'Comment {position}'))
+
+
+@pytest.mark.parametrize('rating_summary', [False, True])
+def test_repository_summarises_ratings(empty_database, rating_summary):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory, rating_summary=rating_summary)
+    populate_repository.populate_db(data_path_tests, repository)
+
+    podcast = repository.get_podcast_by_id(2)
+    add_ratings(repository, podcast, [5, 4, 4, 2.5, 1])
+
+    summary = repository.get_rating_summary(2)
+    assert summary.count == 5
+    assert summary.average == 3.3
+    assert summary.histogram == {1: 1, 2: 1, 3: 0, 4: 2, 5: 1}
+    assert repository.get_rating_summary(3).count == 0
+    assert repository.get_rating_summary(3).average is None
+
+    # The newest reviews, oldest first
+    assert [review.review_content for review in repository.get_reviews_by_podcast_id(2, 2)] == ['Comment 3',
+                                                                                               'Comment 4']
+
+
+def test_repository_rebuilds_rating_summary(empty_database):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory)
+    populate_repository.populate_db(data_path_tests, repository)
+    add_ratings(repository, repository.get_podcast_by_id(2), [5, 4, 1])
+
+    # Reviews added while the summary was off are picked up by a rebuild
+    repository = SqlAlchemyRepository(session_factory, rating_summary=True)
+    assert repository.get_rating_summary(2).count == 0
+    repository.rebuild_rating_summary()
+    summary = repository.get_rating_summary(2)
+    assert (summary.count, summary.total, summary.histogram) == (3, 10, {1: 1, 2: 0, 3: 0, 4: 1, 5: 1})
+
+
+def test_repository_keeps_subscriptions_in_their_own_table(empty_database):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory)
+    populate_repository.populate_db(data_path_tests, repository)
+    repository.add_user(User(None, 'subscriber', 'subscriber1'))
+    user = repository.get_user('subscriber')
+
+    assert repository.add_subscription(user, repository.get_podcast_by_id(3))
+    assert repository.add_subscription(user, repository.get_podcast_by_id(2))
+    assert not repository.add_subscription(user, repository.get_podcast_by_id(3))
+    assert [podcast.id for podcast in repository.get_subscriptions(user)] == [3, 2]
+
+    assert repository.remove_subscription(user, repository.get_podcast_by_id(3))
+    assert not repository.remove_subscription(user, repository.get_podcast_by_id(3))
+    assert [podcast.id for podcast in repository.get_subscriptions(user)] == [2]
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT count(*) FROM user_subscriptions')).scalar() == 1
+
+
+def test_query_cache_evicts_least_recently_used_and_expires():
+    now = [0.0]
+    cache = QueryCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    assert cache.get_or_load('a', lambda: 1) == 1
+    assert cache.get_or_load('b', lambda: 2) == 2
+    assert cache.get_or_load('a', lambda: 'reloaded') == 1
+
+    # 'b' is the least recently used entry
+    cache.get_or_load('c', lambda: 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+    now[0] = 10
+    assert cache.get_or_load('a', lambda: 'expired') == 'expired'
+
+    cache.get_or_load('d', lambda: 4, tag='other')
+    cache.invalidate('other')
+    assert 'd' not in cache and 'a' in cache
+    assert cache.stats() == {'entries': 1, 'max_entries': 2, 'ttl': 10, 'bytes': 0, 'max_bytes': None,
+                             'hits': 1, 'misses': 5, 'evictions': 2}
+
+
+def test_query_cache_limits_memory():
+    cache = QueryCache(max_entries=10, max_bytes=id_list_size(tuple(range(100))) * 2, sizeof=id_list_size)
+    cache.get_or_load('first', lambda: tuple(range(100)))
+    cache.get_or_load('second', lambda: tuple(range(100)))
+    cache.get_or_load('third', lambda: tuple(range(100)))
+    assert 'first' not in cache and 'third' in cache
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+    # A result bigger than the limit on its own is not kept
+    assert len(cache.get_or_load('huge', lambda: tuple(range(1000)))) == 1000
+    assert 'huge' not in cache
+
+
+def test_repository_serves_hot_reads_from_cache(empty_database):
+    engine, session_factory = empty_database
+    repository = SqlAlchemyRepository(session_factory, cache=QueryCache())
+    populate_repository.populate_db(data_path_tests, repository)
+
+    def read_pages():
+        podcast = repository.get_podcast_details('The Mandarian Orange Show')
+        page = repository.get_podcasts_page(0, 10)
+        summary = repository.get_rating_summary(podcast.id)
+        comments = [review.review_content for review in repository.get_reviews_by_podcast_id(podcast.id, 50)]
+        repository.close_session()
+        return (podcast.author.name, podcast.get_categories, len(podcast.get_episodes),
+                render_cards(page.items), page.total, summary.count, comments)
+
+    first = read_pages()
+    with count_queries(engine) as statements:
+        assert read_pages() == first
+    assert statements == []
+
+    # A review invalidates that podcast's ratings and comments, and can refer to the cached podcast
+    repository.add_user(User(None, 'cachereviewer', 'reviewer123'))
+    podcast = repository.get_podcast_details('The Mandarian Orange Show')
+    repository.add_review(Review(None, podcast, repository.get_user('cachereviewer'), 4, 'Cached'))
+    repository.close_session()
+    assert repository.get_rating_summary(podcast.id).count == 1
+    assert [review.review_content for review in repository.get_reviews_by_podcast_id(podcast.id)] == ['Cached']
+    assert podcast.title == 'The Mandarian Orange Show'
+
+    # Adding a podcast invalidates the catalog
+    repository.add_multiple_podcasts([Podcast(9999, repository.get_first_author(), 'Cache Test Podcast')])
+    assert repository.get_podcasts_page(0, 10).total == first[4] + 1
+    assert repository.query_cache.stats()['hits'] >= 4
+
+
+def test_repository_pages_through_cached_search_results(database_setup):
+    engine, session_factory = database_setup
+    repository = SqlAlchemyRepository(session_factory, search_cache=QueryCache(max_bytes=1 << 20, sizeof=id_list_size))
+    repository.ensure_search_index()
+    first = repository.search_podcasts_page('a', 'all', 0, 3)
+    repository.close_session()
+
+    # Later pages, and the same query typed differently, only load the podcasts on the page
+    with count_queries(engine) as statements:
+        second = repository.search_podcasts_page('  A ', 'all', 3, 3)
+    assert len(statements) == 2
+    assert second.total == first.total
+    assert [podcast.id for podcast in first.items + second.items] == list(repository.search_podcast_ids('a'))[:6]
+    assert repository.search_cache.stats()['hits'] >= 2
+    repository.close_session()
+
+
+def test_repository_suggests_from_memory(database_setup):
+    engine, session_factory = database_setup
+    repository = SqlAlchemyRepository(session_factory)
+    repository.build_suggestion_index()
+    repository.close_session()
+
+    with count_queries(engine) as statements:
+        suggestions = repository.suggest('radio')
+    assert statements == []
+    assert ('title', 'Brian Denny Radio') in suggestions
+    assert repository.suggest('comed')[0] == ('category', 'Comedy')
+
+
+def test_repository_fuzzy_search(database_setup):
+    engine, session_factory = database_setup
+    repository = SqlAlchemyRepository(session_factory)
+
+    assert [podcast.id for podcast in repository.search_podcasts('brain deny', 'fuzzy')] == [2]
+    page = repository.search_podcasts_page('radoi', 'fuzzy', 0, 1)
+    assert page.total == 2
+    assert [podcast.id for podcast in page.items] == [2]
+    repository.close_session()
+
+    # The trigram index is held in memory, so only the podcasts on the page are read
+    with count_queries(engine) as statements:
+        repository.search_podcasts_page('radoi', 'fuzzy', 1, 1)
+    assert len(statements) == 2
@@ -1,23 +1,33 @@
-from sqlalchemy import select, inspect
+from sqlalchemy import create_engine, select, inspect, text
 
 import pytest
 
 from sqlalchemy.orm import sessionmaker
 
-from podcast.domainmodel.model import Podcast, Author, Review, Episode, Category
+from podcast.domainmodel.model import Podcast, Author, Review, Episode, Category, User
+from podcast.adapters.migrations import upgrade
+from podcast.adapters.orm import podcast_categories_table, reviews_table, user_subscriptions_table
+from podcast.adapters.database_repository import SqlAlchemyRepository
+from podcast.adapters.populate_repository import populate_db
+from tests_db.conftest import data_path_tests
 
 
 def test_database_populate_inspect_table_name(database_setup):
     engine, session_factory = database_setup
     inspector = inspect(engine)
-    assert inspector.get_table_names() == [
+    table_names = inspector.get_table_names()
+    # populate_db also creates the FTS5 search table, which SQLite backs with shadow tables
+    assert 'podcast_search' in table_names
+    assert [name for name in table_names if not name.startswith('podcast_search')] == [
         'authors',
         'categories',
         'episodes',
         'playlist',
         'podcast_categories',
+        'podcast_rating_summary',
         'podcasts',
         'reviews',
+        'user_subscriptions',
         'user_to_favorite_podcasts',
         'users'
     ]
@@ -91,3 +101,94 @@ def test_database_populate_select_all_categories(database_setup):
     assert len(categories) > 0
     assert repr(categories[0]) == "<Category 1: Professional>"
     assert repr(category_name_list[0:4]) == "['Professional', 'News & Politics', 'Sports & Recreation', 'Comedy']"
+
+def test_database_populate_in_chunks(empty_database):
+    engine, session_factory = empty_database
+    repo_instance = SqlAlchemyRepository(session_factory)
+
+    # A chunk size smaller than the test data forces several chunks per table
+    populate_db(data_path_tests, repo_instance, chunk_size=4)
+
+    session = session_factory()
+    assert session.query(Podcast).count() == 14
+    assert session.query(Author).count() == 14
+    assert session.query(Category).count() == 11
+    assert session.query(Episode).count() == 15
+
+    podcast = session.query(Podcast).filter(Podcast._id == 2).one()
+    assert repr(podcast) == "<Podcast 2: 'Brian Denny Radio' by Brian Denny>"
+    assert [category.name for category in podcast.categories][:2] == ['Professional', 'News & Politics']
+    session.close()
+
+
+def test_database_populate_reports_progress(empty_database):
+    engine, session_factory = empty_database
+    repo_instance = SqlAlchemyRepository(session_factory)
+
+    calls = []
+    report = populate_db(data_path_tests, repo_instance, batch_size=5,
+                         progress=lambda table, rows, rate: calls.append((table, rows)))
+
+    assert report.rows == {'authors': 14, 'categories': 11, 'podcasts': 14, 'podcast_categories': 25,
+                           'episodes': 15}
+    assert report.rows_per_second > 0
+    # Batches of five rows, reported with the running count of their table
+    assert [rows for table, rows in calls if table == 'podcasts'] == [5, 10, 14]
+    assert calls[-1] == ('episodes', 15)
+
+    session = session_factory()
+    podcast = session.query(Podcast).filter(Podcast._id == 2).one()
+    assert podcast.author.name == 'Brian Denny'
+    assert podcast.deserialize_comments() == []
+    assert [episode.episode_id for episode in repo_instance.get_episodes_for_podcast(14)] == [1]
+    session.close()
+
+
+def query_plan(session, query) -> str:
+    statement = query.statement.compile(session.get_bind(), compile_kwargs={'literal_binds': True})
+    rows = session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def test_hot_queries_use_indexes(database_setup):
+    engine, session_factory = database_setup
+    session = session_factory()
+
+    plans = {
+        'title': query_plan(session, session.query(Podcast).filter(Podcast._title == 'Brian Denny Radio')),
+        'library': query_plan(session, session.query(Podcast).order_by(Podcast._title, Podcast._id).limit(30)),
+        'user': query_plan(session, session.query(User).filter(User._username == 'thorke1234')),
+        'episodes': query_plan(session, session.query(Episode).filter(Episode.podcast_id == 2)),
+        'reviews': query_plan(session, session.query(Review).filter(reviews_table.c.podcast_id == 2)),
+        'podcast categories': query_plan(session, session.query(podcast_categories_table)
+                                         .filter(podcast_categories_table.c.podcast_id == 2)),
+        'category podcasts': query_plan(session, session.query(podcast_categories_table)
+                                        .filter(podcast_categories_table.c.category_id == 3)),
+        'subscriptions': query_plan(session, session.query(Podcast)
+                                    .join(user_subscriptions_table,
+                                          user_subscriptions_table.c.podcast_id == Podcast._id)
+                                    .filter(user_subscriptions_table.c.user_id == 1)),
+    }
+    session.close()
+
+    assert 'ix_podcasts_title' in plans['title']
+    assert 'ix_podcasts_title' in plans['library'] and 'TEMP B-TREE' not in plans['library']
+    assert 'sqlite_autoindex_users_1' in plans['user']
+    assert 'ix_episodes_podcast' in plans['episodes']
+    assert 'ix_reviews_podcast' in plans['reviews']
+    assert 'ix_podcast_categories_podcast' in plans['podcast categories']
+    assert 'ix_podcast_categories_category' in plans['category podcasts']
+    assert 'sqlite_autoindex_user_subscriptions_1' in plans['subscriptions']
+
+
+def test_upgrade_adds_missing_indexes(tmp_path):
+    database_engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with database_engine.begin() as connection:
+        connection.execute(text('CREATE TABLE podcasts (podcast_id INTEGER PRIMARY KEY, podcast_title TEXT)'))
+
+    created = upgrade(database_engine)
+    assert 'ix_podcasts_title' in created
+    assert 'ix_podcasts_title' in {index['name'] for index in inspect(database_engine).get_indexes('podcasts')}
+
+    # Running it again changes nothing
+    assert upgrade(database_engine) == []
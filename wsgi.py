@@ -1,4 +1,8 @@
-"""App entry point."""
+"""App entry point.
+
+To share one catalog between several workers, set PRELOAD = True in .env and build the app
+in the master process, e.g. `gunicorn --preload --workers 16 wsgi:app`.
+"""
 
 import sys
 import os